@@ -1,8 +1,11 @@
 from django.shortcuts import render
 
 from scifiweb.home import MEMBERS
+from scifiweb.page_cache import cache_response
+from scifiweb.utils import store_decorators
 
 
+@store_decorators((cache_response(),))
 def index(article, request):
     return render(
         request,
@@ -15,6 +18,7 @@ def index(article, request):
     )
 
 
+@store_decorators((cache_response(),))
 def team(article, request):
     return render(
         request,
@@ -0,0 +1,305 @@
+import bisect
+import hmac
+import itertools
+import os
+import pickle
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.http import Http404
+from django.http import JsonResponse
+
+
+# Upper bounds of histogram buckets, in milliseconds and bytes
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# How often each worker publishes its counters to the shared cache
+_FLUSH_INTERVAL = 30
+# Snapshots of workers which stopped publishing are forgotten after this
+_SNAPSHOT_TTL = 24 * 60 * 60
+_WORKERS_KEY = 'cache_stats_workers'
+# Values which aren't bytes have one in this many sizes recorded
+_SIZE_SAMPLE_RATE = 16
+_size_samples = itertools.count()
+
+
+def key_family(key):
+    """Returns the family a cache key belongs to, e.g. `wp_post_by_id`
+    for `wp_post_by_id:1.k2f9x1:5` or `scifiweb.templatetags.image.svg`
+    for a key made by the `cache` decorator."""
+    if isinstance(key, str):
+        return key.split(':', 1)[0]
+    return 'other'
+
+
+class Histogram:
+    """A fixed-bucket histogram, cheap enough to update on every cache
+    operation. Observations above the last bucket go in an overflow
+    bucket."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def to_dict(self):
+        return {'counts': list(self.counts), 'total': self.total}
+
+    def merge(self, other):
+        for i, count in enumerate(other['counts']):
+            self.counts[i] += count
+        self.total += other['total']
+
+    def mean(self):
+        count = self.count
+        return self.total / count if count else None
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket containing quantile
+        `q`, or `None` for an empty histogram."""
+        count = self.count
+        if not count:
+            return None
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += bucket_count
+            if seen >= q * count:
+                return bound
+
+
+class FamilyStats:
+    """Counters for one family of cache keys."""
+
+    COUNTERS = ('hits', 'local_hits', 'misses', 'stale_hits')
+    HISTOGRAMS = {
+        'get_ms': LATENCY_BUCKETS,
+        'set_ms': LATENCY_BUCKETS,
+        'fallback_ms': LATENCY_BUCKETS,
+        'value_bytes': SIZE_BUCKETS,
+    }
+
+    def __init__(self):
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+        for name, buckets in self.HISTOGRAMS.items():
+            setattr(self, name, Histogram(buckets))
+
+    def to_dict(self):
+        result = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        result.update({
+            name: getattr(self, name).to_dict() for name in self.HISTOGRAMS
+        })
+        return result
+
+    def merge(self, other):
+        for counter in self.COUNTERS:
+            setattr(self, counter, getattr(self, counter) + other[counter])
+        for name in self.HISTOGRAMS:
+            getattr(self, name).merge(other[name])
+
+    @property
+    def lookups(self):
+        return self.hits + self.local_hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return (self.hits + self.local_hits) / self.lookups if self.lookups else None
+
+
+class CacheStats:
+    """Per-process cache counters, grouped by key family.
+
+    Every `_FLUSH_INTERVAL` seconds a snapshot is published to the shared
+    cache under this worker's id, so that stats for all workers can be
+    read from anywhere.
+    """
+
+    def __init__(self):
+        self.worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.started = time.time()
+        self._families = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _family(self, key):
+        family = key_family(key)
+        try:
+            return self._families[family]
+        except KeyError:
+            return self._families.setdefault(family, FamilyStats())
+
+    def count(self, key, counter):
+        with self._lock:
+            stats = self._family(key)
+            setattr(stats, counter, getattr(stats, counter) + 1)
+        self._maybe_flush()
+
+    def observe(self, key, histogram, value):
+        with self._lock:
+            getattr(self._family(key), histogram).observe(value)
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'worker': self.worker_id,
+                'started': self.started,
+                'families': {
+                    family: stats.to_dict()
+                    for family, stats in self._families.items()
+                },
+            }
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        if now - self._last_flush < _FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        self.flush()
+
+    def flush(self):
+        """Publishes this worker's snapshot to the shared cache."""
+        # Writing through django_cache directly keeps these writes out of
+        # the stats themselves
+        try:
+            django_cache.set(
+                'cache_stats:' + self.worker_id, self.snapshot(), _SNAPSHOT_TTL,
+            )
+            workers = django_cache.get(_WORKERS_KEY) or set()
+            if self.worker_id not in workers:
+                django_cache.set(
+                    _WORKERS_KEY, workers | {self.worker_id}, _SNAPSHOT_TTL,
+                )
+        except Exception:
+            # Stats are never worth failing a request over
+            pass
+
+
+_stats = None
+_stats_pid = None
+
+
+def stats():
+    """Returns this process's `CacheStats`, starting afresh after a
+    fork."""
+    global _stats, _stats_pid
+    if _stats_pid != os.getpid():
+        _stats = CacheStats()
+        _stats_pid = os.getpid()
+    return _stats
+
+
+def value_size(value):
+    """Returns the approximate stored size of a value in bytes."""
+    if isinstance(value, bytes):
+        return len(value)
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def observe_size(key, value):
+    """Records the approximate stored size of a value in the histogram of
+    the family of `key`.
+
+    Bytes are always measured, but anything else has to be pickled again
+    to be measured, so only one in `_SIZE_SAMPLE_RATE` of those is.
+    """
+    if isinstance(value, bytes) or next(_size_samples) % _SIZE_SAMPLE_RATE == 0:
+        stats().observe(key, 'value_bytes', value_size(value))
+
+
+@contextmanager
+def timed(key, histogram):
+    """Records the duration of the block, in milliseconds, in a histogram
+    of the family of `key`."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        stats().observe(key, histogram, (time.monotonic() - start) * 1000)
+
+
+def collect_snapshots():
+    """Returns the latest snapshots of all workers, including this one."""
+    own = stats().snapshot()
+    workers = django_cache.get(_WORKERS_KEY) or set()
+    snapshots = django_cache.get_many(
+        ['cache_stats:' + worker for worker in workers if worker != own['worker']],
+    )
+    return [own] + list(snapshots.values())
+
+
+def aggregate(snapshots):
+    """Merges worker snapshots into a dict of `FamilyStats`."""
+    families = {}
+    for snapshot in snapshots:
+        for family, data in snapshot['families'].items():
+            families.setdefault(family, FamilyStats()).merge(data)
+    return families
+
+
+def summarize(families):
+    """Returns a JSON-friendly summary of aggregated stats, lowest hit
+    rate first."""
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+
+    rows = []
+    for family, stats in families.items():
+        rows.append({
+            'family': family,
+            'lookups': stats.lookups,
+            'hits': stats.hits,
+            'local_hits': stats.local_hits,
+            'stale_hits': stats.stale_hits,
+            'misses': stats.misses,
+            'hit_rate': rounded(stats.hit_rate),
+            'get_ms_mean': rounded(stats.get_ms.mean()),
+            'get_ms_p95': stats.get_ms.quantile(0.95),
+            'set_ms_mean': rounded(stats.set_ms.mean()),
+            'fallback_ms_mean': rounded(stats.fallback_ms.mean()),
+            'fallback_ms_p95': stats.fallback_ms.quantile(0.95),
+            'value_bytes_mean': rounded(stats.value_bytes.mean()),
+        })
+    rows.sort(key=lambda row: (
+        row['hit_rate'] if row['hit_rate'] is not None else 2,
+        -row['lookups'],
+    ))
+    return rows
+
+
+def cache_stats_view(request):
+    """Internal endpoint with cache stats aggregated over all workers.
+
+    Only available in debug mode, or with the configured token as a
+    bearer token.
+    """
+    if not settings.DEBUG:
+        token = settings.CACHE_STATS_TOKEN
+        provided = request.META.get('HTTP_AUTHORIZATION', '')
+        if not token or not hmac.compare_digest(provided, 'Bearer ' + token):
+            raise Http404()
+
+    snapshots = collect_snapshots()
+    return JsonResponse(
+        {
+            'workers': sorted(snapshot['worker'] for snapshot in snapshots),
+            'families': summarize(aggregate(snapshots)),
+        },
+        json_dumps_params={'indent': 2},
+    )
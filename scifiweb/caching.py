@@ -1,14 +1,394 @@
+import hashlib
 import logging
+import os
 import random
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.core.cache import cache as django_cache
 
+from scifiweb.cache_stats import key_family
+from scifiweb.cache_stats import observe_size
+from scifiweb.cache_stats import stats
+from scifiweb.cache_stats import timed
+from scifiweb.circuit import CircuitOpenError
+
 
 _logger = logging.getLogger(__name__)
 
 
-def cache_lookup(key):
-    """Look up a key in the cache, raising KeyError if it's a miss."""
+class LocalCache:
+    """A small in-process LRU cache which sits in front of the shared
+    (Redis) cache.
+
+    Entries expire after their own TTL, just like in Redis, but no later
+    than `max_ttl` seconds (if given) so that changes made by other
+    processes show up in time. The least recently used entry is evicted
+    once `max_entries` is reached. A TTL of `None` means the entry only
+    leaves by eviction. All operations are thread-safe.
+    """
+
+    def __init__(self, max_entries, max_ttl=None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except (KeyError, TypeError):
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if self.max_entries <= 0 or (ttl is not None and ttl <= 0):
+            return
+        if self.max_ttl is not None:
+            ttl = min(ttl, self.max_ttl) if ttl is not None else self.max_ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            try:
+                self._entries[key] = (value, expires)
+            except TypeError:
+                # Unhashable keys can only live in the shared cache
+                return
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                del self._entries[key]
+            except (KeyError, TypeError):
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+
+def local_cache():
+    """Returns this process's `LocalCache`, creating it on first use.
+
+    Its size comes from the `LOCAL_CACHE_MAX_ENTRIES` setting; a size
+    of zero disables the local tier. Entries are kept for at most
+    `LOCAL_CACHE_MAX_TTL` seconds.
+    """
+    global _local_cache
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                _local_cache = LocalCache(
+                    getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', 0),
+                    getattr(settings, 'LOCAL_CACHE_MAX_TTL', None),
+                )
+    return _local_cache
+
+
+# Key parts which are safe to use verbatim; anything else is hashed
+_READABLE_KEY_PART = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+# How long a process trusts its copy of a family's generation
+_GENERATION_CHECK_INTERVAL = 5
+
+
+def _base36(n):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    result = ''
+    while True:
+        n, digit = divmod(n, 36)
+        result = digits[digit] + result
+        if not n:
+            return result
+
+
+class KeyFamily(namedtuple('KeyFamily', ('name', 'version', 'codec'))):
+    """A family of cache keys, such as all posts by id.
+
+    Keys look like `wp_post_by_id:1.k2f9x1:5`, i.e. the family name,
+    its schema version and generation, and the identifying parts of the
+    key. Parts which aren't short and plain are replaced by a hash, so
+    keys stay short and safe for any backend.
+
+    The schema version is fixed in code: bump it when the shape of the
+    cached values changes, e.g. when fields are added to `Post`. The
+    generation lives in the shared cache and is bumped with `bump()` to
+    invalidate every key in the family at once at runtime.
+
+    A family may have a codec, which converts its values to and from
+    bytes for the shared cache in place of pickling. It needs `dumps`
+    and `loads` methods, and may have a `loads_many` method to decode a
+    list of values at once. The in-process cache holds decoded values.
+
+    With `local=False`, values are only kept in the shared cache, e.g.
+    for data which pages are rendered from: a process could otherwise
+    re-render a page from its own outdated copy right after the page
+    was invalidated, and cache it again.
+    """
+    __slots__ = ()
+
+    _generations = {}
+    _generations_lock = threading.Lock()
+    _codecs = {}
+    _shared_only = set()
+
+    def __new__(cls, name, version=1, codec=None, local=True):
+        if codec is not None:
+            cls._codecs[name] = codec
+        if not local:
+            cls._shared_only.add(name)
+        return super().__new__(cls, name, version, codec)
+
+    @property
+    def _generation_key(self):
+        return 'cache_generation:' + self.name
+
+    def generation(self):
+        """Returns the family's current generation.
+
+        It's only fetched from the shared cache every few seconds. If it
+        was never set (or got evicted), it's started at the current time
+        so it can't go back to a value used before.
+        """
+        now = time.monotonic()
+        with self._generations_lock:
+            cached = self._generations.get(self.name)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        generation = django_cache.get(self._generation_key)
+        if generation is None:
+            django_cache.add(self._generation_key, int(time.time()), None)
+            generation = django_cache.get(self._generation_key) or 0
+
+        with self._generations_lock:
+            self._generations[self.name] = (
+                generation, now + _GENERATION_CHECK_INTERVAL,
+            )
+        return generation
+
+    def bump(self):
+        """Invalidates every key in the family, in all processes.
+
+        Other processes notice within `_GENERATION_CHECK_INTERVAL`
+        seconds; old entries are left to expire on their own.
+        """
+        try:
+            generation = django_cache.incr(self._generation_key)
+        except ValueError:
+            # Never set, or evicted: restart from the clock, but make sure
+            # to move past the generation this process was using
+            with self._generations_lock:
+                cached = self._generations.get(self.name)
+            generation = max(int(time.time()), cached[0] + 1 if cached else 0)
+            django_cache.set(self._generation_key, generation, None)
+        with self._generations_lock:
+            self._generations.pop(self.name, None)
+        _logger.info('Bumped cache key family {} to generation {}'.format(
+            self.name, generation,
+        ))
+        return generation
+
+    def key(self, *parts):
+        """Returns the cache key for the given identifying parts."""
+        return self._prefix() + _key_suffix(parts)
+
+    def keys(self, ids):
+        """Returns the cache keys for many single-part keys at once, e.g.
+        a list of post ids, checking the generation only once."""
+        prefix = self._prefix()
+        return [
+            prefix + (str(id) if type(id) is int else _key_suffix((id,)))
+            for id in ids
+        ]
+
+    def _prefix(self):
+        return '{}:{}.{}:'.format(self.name, self.version, _base36(self.generation()))
+
+
+def _key_suffix(parts):
+    if all(
+        type(part) is int or _READABLE_KEY_PART.match(str(part))
+        for part in parts
+    ):
+        return ':'.join(str(part) for part in parts)
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def _codec_for(key):
+    if isinstance(key, str):
+        return KeyFamily._codecs.get(key.split(':', 1)[0])
+
+
+def _is_local(key):
+    """Returns whether a key may be kept in the in-process cache."""
+    return local_cache().max_entries > 0 and not (
+        isinstance(key, str) and key.split(':', 1)[0] in KeyFamily._shared_only
+    )
+
+
+def _encode(key, value):
+    """Converts a value (or stale entry) to its form in the shared
+    cache. `None` is stored as is, e.g. to cache that something doesn't
+    exist."""
+    codec = _codec_for(key)
+    if codec is None:
+        return value
+    if isinstance(value, _StaleEntry):
+        if value.value is None:
+            return value
+        return value._replace(value=codec.dumps(value.value))
+    if value is None:
+        return value
+    return codec.dumps(value)
+
+
+def _payload(stored):
+    """Returns the part of a stored value which makes up its size, i.e.
+    the encoded value of a stale entry."""
+    return stored.value if isinstance(stored, _StaleEntry) else stored
+
+
+def _decode_many(keys, entries):
+    """Decodes entries from the shared cache for keys of a single codec
+    family, returning a dict of the ones which decoded cleanly.
+
+    Entries in a format we can't read are treated as misses, and so are
+    entries which a codec can't decode right now, e.g. because something
+    they refer to isn't cached (for which codecs raise KeyError).
+    """
+    codec = _codec_for(keys[0])
+    if codec is None:
+        return dict(zip(keys, entries))
+
+    def loads_many(datas):
+        if hasattr(codec, 'loads_many'):
+            return codec.loads_many(datas)
+        return [codec.loads(data) for data in datas]
+
+    decoded = {}
+    indices = [
+        i for i, entry in enumerate(entries)
+        if (entry.value if isinstance(entry, _StaleEntry) else entry) is not None
+    ]
+    datas = [
+        entries[i].value if isinstance(entries[i], _StaleEntry) else entries[i]
+        for i in indices
+    ]
+    try:
+        decoded.update(zip(indices, loads_many(datas)))
+    except (ValueError, KeyError):
+        # Try them one at a time, so that only the bad ones are misses
+        for i, data in zip(indices, datas):
+            try:
+                decoded[i] = loads_many([data])[0]
+            except (ValueError, KeyError):
+                _logger.warning('Could not decode cached value: {}'.format(keys[i]), exc_info=True)
+
+    result = {}
+    for i, (key, entry) in enumerate(zip(keys, entries)):
+        if i in decoded:
+            value = decoded[i]
+        elif i in indices:
+            continue
+        else:
+            value = None
+        result[key] = entry._replace(value=value) if isinstance(entry, _StaleEntry) else value
+    return result
+
+
+def _remaining_ttl(key):
+    """Returns how many seconds a key has left in the shared cache, or
+    `None` if it never expires.
+
+    Backends which can't tell us (anything but Redis) get the fallback
+    `LOCAL_CACHE_DEFAULT_TTL` so local copies can't live forever.
+    """
+    default = getattr(settings, 'LOCAL_CACHE_DEFAULT_TTL', 60)
+    if not hasattr(django_cache, 'ttl'):
+        return default
+    # django-redis returns None for persistent keys and 0 for missing ones
+    return django_cache.ttl(key)
+
+
+def _remaining_ttls(keys):
+    """Like `_remaining_ttl`, but for many keys in one round trip.
+
+    Returns a dict mapping each key to its TTL. Keys without a known
+    expiry get `LOCAL_CACHE_DEFAULT_TTL`.
+    """
+    default = getattr(settings, 'LOCAL_CACHE_DEFAULT_TTL', 60)
+    if not keys or not hasattr(django_cache, 'ttl'):
+        return {key: default for key in keys}
+    pipeline = django_cache.client.get_client(write=False).pipeline()
+    for key in keys:
+        pipeline.ttl(django_cache.client.make_key(key))
+    return {
+        key: ttl if ttl is not None and ttl >= 0 else default
+        for key, ttl in zip(keys, pipeline.execute())
+    }
+
+
+def _get_with_ttl(key, default):
+    """Gets a key from the shared cache, returning a pair `(value, ttl)`
+    of its value (or `default`) and how long it has left to live, as
+    `_remaining_ttl` would.
+
+    On Redis, both are fetched in one round trip. The TTL is only needed
+    for in-process copies, so it isn't fetched if there's no in-process
+    cache.
+    """
+    if not _is_local(key):
+        return django_cache.get(key, default), None
+    if not hasattr(django_cache, 'ttl'):
+        return django_cache.get(key, default), _remaining_ttl(key)
+    client = django_cache.client
+    redis_key = client.make_key(key)
+    pipeline = client.get_client(write=False).pipeline()
+    pipeline.get(redis_key)
+    pipeline.ttl(redis_key)
+    value, ttl = pipeline.execute()
+    if value is None:
+        return default, None
+    # Redis gives -1 for keys which never expire
+    return client.decode(value), ttl if ttl is not None and ttl >= 0 else None
+
+
+class _StaleEntry(namedtuple('_StaleEntry', ('value', 'fresh_until'))):
+    """A cached value which should be refreshed after the wall-clock
+    time `fresh_until`, but which may be served until it expires."""
+    __slots__ = ()
+
+
+def _cache_get(key, record=True):
+    """Looks up the raw stored entry for a key, raising KeyError if
+    it's a miss.
+
+    The in-process cache is tried first. Values found in the shared
+    cache are copied into it for as long as they have left to live.
+
+    Lookups are counted in the cache stats unless `record` is false,
+    which is for internal re-checks of a key already counted.
+    """
     # More good code from ocfweb:
     #
     # The "get" method returns `None` both for cached values of `None`,
@@ -18,31 +398,369 @@ def cache_lookup(key):
     # return value for when a key is missing. This allows us to still
     # cache functions which return None.
     cache_miss_sentinel = {}
-    retval = django_cache.get(key, cache_miss_sentinel)
+    retval = local_cache().get(key, cache_miss_sentinel)
+    if retval is not cache_miss_sentinel:
+        _logger.debug('Local cache hit: {}'.format(key))
+        if record:
+            stats().count(key, 'local_hits')
+        return retval
+
+    with timed(key, 'get_ms'):
+        retval, ttl = _get_with_ttl(key, cache_miss_sentinel)
     is_hit = retval is not cache_miss_sentinel
+    if is_hit:
+        decoded = _decode_many([key], [retval])
+        is_hit = key in decoded
+        retval = decoded.get(key)
 
     if not is_hit:
         _logger.debug('Cache miss: {}'.format(key))
+        if record:
+            stats().count(key, 'misses')
         raise KeyError('Key "{}" is not in the cache.'.format(key))
     else:
         _logger.debug('Cache hit: {}'.format(key))
+        if record:
+            stats().count(key, 'hits')
+        if _is_local(key):
+            local_cache().set(key, retval, ttl)
         return retval
 
 
-def cache_lookup_with_fallback(key, fallback, ttl):
+def _cache_lookup_entry(key, record=True):
+    """Returns a pair `(value, is_stale)` for a key, raising KeyError if
+    it's a miss."""
+    entry = _cache_get(key, record)
+    if isinstance(entry, _StaleEntry):
+        is_stale = time.time() >= entry.fresh_until
+        if is_stale and record:
+            stats().count(key, 'stale_hits')
+        return entry.value, is_stale
+    return entry, False
+
+
+def cache_lookup(key, record=True):
+    """Look up a key in the cache, raising KeyError if it's a miss.
+
+    Values past their soft expiry (see `cache_set`) are still returned.
+    The lookup isn't counted in the cache stats unless `record` is true,
+    e.g. when checking again for a key whose lookup was just counted.
+    """
+    return _cache_lookup_entry(key, record)[0]
+
+
+def cache_lookup_many(keys, refresh=None, record=True):
+    """Looks up many keys at once, returning a dict of the keys which
+    were hits.
+
+    Keys missing from the in-process cache are fetched from the shared
+    cache in a single round trip (`MGET` on Redis). As with `get_many`,
+    backends other than Redis report keys holding `None` as misses.
+
+    If `refresh` is given, it is called in the background with each key
+    whose value is stale. As with `cache_lookup`, lookups are only
+    counted in the cache stats if `record` is true.
+    """
+    cache_miss_sentinel = {}
+    entries = {}
+    missing = []
+    for key in keys:
+        entry = local_cache().get(key, cache_miss_sentinel)
+        if entry is cache_miss_sentinel:
+            missing.append(key)
+        else:
+            if record:
+                stats().count(key, 'local_hits')
+            entries[key] = entry
+
+    if missing:
+        start = time.monotonic()
+        stored = django_cache.get_many(missing)
+        _observe_batch(missing, 'get_ms', start)
+        by_codec = {}
+        for key in stored:
+            by_codec.setdefault(_codec_for(key), []).append(key)
+        found = {}
+        for codec_keys in by_codec.values():
+            found.update(_decode_many(
+                codec_keys, [stored[key] for key in codec_keys],
+            ))
+        _logger.debug('Cache get_many: {} of {} hit'.format(len(found), len(missing)))
+        if record:
+            for key in missing:
+                stats().count(key, 'hits' if key in found else 'misses')
+        local_keys = [key for key in found if _is_local(key)]
+        if local_keys:
+            ttls = _remaining_ttls(local_keys)
+            for key in local_keys:
+                local_cache().set(key, found[key], ttls[key])
+        entries.update(found)
+
+    result = {}
+    now = time.time()
+    for key, entry in entries.items():
+        if isinstance(entry, _StaleEntry):
+            if record and now >= entry.fresh_until:
+                stats().count(key, 'stale_hits')
+            if refresh and now >= entry.fresh_until:
+                _refresh_in_background(key, lambda key=key: refresh(key))
+            entry = entry.value
+        result[key] = entry
+    return result
+
+
+def cache_set(key, value, ttl, stale_ttl=None):
+    """Stores a value in both the shared and the in-process cache.
+
+    A ttl of `None` keeps the value until it is flushed (or, locally,
+    evicted).
+
+    If `stale_ttl` is given, `ttl` is only a soft expiry: the value is
+    kept for another `stale_ttl` seconds, during which lookups still
+    return it while it gets refreshed in the background.
+    """
+    if stale_ttl and ttl is not None:
+        value = _StaleEntry(value, time.time() + ttl)
+        ttl += stale_ttl
+    stored = _encode(key, value)
+    with timed(key, 'set_ms'):
+        django_cache.set(key, stored, ttl)
+    observe_size(key, _payload(stored))
+    if _is_local(key):
+        local_cache().set(key, value, ttl)
+
+
+def cache_set_many(data, ttl, stale_ttl=None):
+    """Stores a dict of keys and values in both cache tiers, like
+    `cache_set`, writing to Redis in a single pipeline."""
+    if not data:
+        return
+    if stale_ttl and ttl is not None:
+        fresh_until = time.time() + ttl
+        data = {
+            key: _StaleEntry(value, fresh_until)
+            for key, value in data.items()
+        }
+        ttl += stale_ttl
+    stored = {key: _encode(key, value) for key, value in data.items()}
+    start = time.monotonic()
+    django_cache.set_many(stored, ttl)
+    _observe_batch(data, 'set_ms', start)
+    for key, value in data.items():
+        observe_size(key, _payload(stored[key]))
+        if _is_local(key):
+            local_cache().set(key, value, ttl)
+
+
+def _observe_batch(keys, histogram, start):
+    """Records the duration of a batched operation which started at
+    `start` once for every key family involved."""
+    elapsed = (time.monotonic() - start) * 1000
+    for key in {key_family(key): key for key in keys}.values():
+        stats().observe(key, histogram, elapsed)
+
+
+def cache_delete(key):
+    """Removes a key from both the shared and the in-process cache.
+
+    Other processes keep their local copy until it expires.
+    """
+    django_cache.delete(key)
+    local_cache().delete(key)
+
+
+# How long a recompute lock is held at most, i.e. how long the slowest
+# fallback (five one-second API retries) may take before others give up
+_LOCK_TTL = 10
+# How long processes which lost the lock wait for the winner's result
+_LOCK_WAIT = 3
+_LOCK_POLL_INTERVAL = 0.05
+
+
+class _Flight:
+    """A computation in progress which other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _single_flight(key, fn):
+    """Calls `fn` unless another thread in this process is already
+    computing `key`, in which case its result (or exception) is shared.
+    """
+    with _flights_lock:
+        try:
+            flight = _flights.get(key)
+        except TypeError:
+            # Unhashable keys can't be deduplicated
+            flight = None
+            is_leader = False
+        else:
+            is_leader = flight is None
+            if is_leader:
+                flight = _flights[key] = _Flight()
+
+    if flight is None:
+        return fn()
+
+    if not is_leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fn()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _lock_key(key):
+    return 'cache_lock:{}'.format(key)
+
+
+def _release_lock(lock_key, token):
+    # Never release a lock which expired and was taken by someone else
+    if django_cache.get(lock_key) == token:
+        django_cache.delete(lock_key)
+
+
+def _recompute(key, fallback, ttl, stale_ttl=None):
+    """Recomputes a missing key, making sure only one process does so.
+
+    The process which manages to take a short-lived lock in the shared
+    cache calls the fallback. The others poll the cache for its result
+    for a little while, then give up and call the fallback themselves.
+    """
+    lock_key = _lock_key(key)
+    token = uuid.uuid4().hex
+    if not django_cache.add(lock_key, token, _LOCK_TTL):
+        _logger.debug('Waiting for recompute lock: {}'.format(key))
+        deadline = time.monotonic() + _LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(_LOCK_POLL_INTERVAL)
+            try:
+                return _cache_lookup_entry(key, record=False)[0]
+            except KeyError:
+                pass
+        _logger.debug('Gave up waiting for recompute lock: {}'.format(key))
+    else:
+        # Someone may have finished recomputing just before we locked
+        try:
+            result = _cache_lookup_entry(key, record=False)[0]
+        except KeyError:
+            pass
+        else:
+            _release_lock(lock_key, token)
+            return result
+
+    try:
+        with timed(key, 'fallback_ms'):
+            result = fallback()
+        cache_set(key, result, ttl, stale_ttl)
+        _logger.debug('TTL is: {} {}'.format(ttl, key))
+        return result
+    finally:
+        _release_lock(lock_key, token)
+
+
+_refresh_executor = None
+_refresh_executor_pid = None
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _get_refresh_executor():
+    """Returns the thread pool for background refreshes, recreating it
+    if we've been forked since it was made."""
+    global _refresh_executor, _refresh_executor_pid
+    with _refreshing_lock:
+        if _refresh_executor_pid != os.getpid():
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CACHE_REFRESH_THREADS', 4),
+            )
+            _refresh_executor_pid = os.getpid()
+            _refreshing.clear()
+        return _refresh_executor
+
+
+def _refresh_in_background(key, refresh):
+    """Schedules `refresh()` to run in the background, unless this key
+    is already being refreshed by this or another process.
+
+    Failures are logged and otherwise ignored, so the stale value keeps
+    being served until it expires.
+    """
+    executor = _get_refresh_executor()
+    with _refreshing_lock:
+        try:
+            if key in _refreshing:
+                return
+            _refreshing.add(key)
+        except TypeError:
+            # Unhashable keys can't be tracked, so don't refresh them
+            return
+
+    def run():
+        lock_key = _lock_key(key)
+        token = uuid.uuid4().hex
+        try:
+            if django_cache.add(lock_key, token, _LOCK_TTL):
+                try:
+                    _logger.debug('Refreshing stale key: {}'.format(key))
+                    with timed(key, 'fallback_ms'):
+                        refresh()
+                finally:
+                    _release_lock(lock_key, token)
+        except CircuitOpenError:
+            _logger.debug('Background refresh skipped, circuit open: {}'.format(key))
+        except Exception:
+            _logger.exception('Background refresh failed: {}'.format(key))
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    executor.submit(run)
+
+
+def cache_lookup_with_fallback(key, fallback, ttl, stale_ttl=None):
     """Returns the value of a key if it is in the cache, otherwise
     update the cache with a fallback function and return that.
+
+    Concurrent misses on the same key are collapsed: within a process
+    only one thread calls the fallback, and across processes a lock in
+    the shared cache elects a single recomputer.
+
+    With a `stale_ttl`, values past their `ttl` are returned right away
+    and the fallback is called in the background to refresh them.
     """
     try:
-        result = cache_lookup(key)
+        result, is_stale = _cache_lookup_entry(key)
     except KeyError:
-        result = fallback()
-        django_cache.set(key, result, ttl)
-        _logger.debug('TTL is: {} {}'.format(ttl, key))
+        return _single_flight(
+            key, lambda: _recompute(key, fallback, ttl, stale_ttl),
+        )
+
+    if is_stale:
+        _refresh_in_background(
+            key, lambda: cache_set(key, fallback(), ttl, stale_ttl),
+        )
     return result
 
 
-def cache(ttl=None, key=None, randomize=True):
+def cache(ttl=None, key=None, randomize=True, stale_ttl=None, version=1):
     """Caching function decorator, with an optional ttl and custom key
     function.
 
@@ -55,6 +773,13 @@ def cache(ttl=None, key=None, randomize=True):
     By default, TTLs are augmented by a random factor to prevent a cache
     stampede where many keys expire at once. This can be disabled
     per-function.
+
+    If `stale_ttl` is given, entries older than `ttl` are served for up
+    to `stale_ttl` more seconds while being recomputed in a background
+    thread, so callers almost never wait on the cached function.
+
+    Default keys belong to a `KeyFamily` named after the function; bump
+    `version` when the function's return values change shape.
     """
     if ttl and randomize:
         rand = random.Random()
@@ -69,46 +794,63 @@ def cache(ttl=None, key=None, randomize=True):
             make_key = key
         else:
             def make_key(*args, **kwargs):
-                return _make_function_call_key(fn, args, kwargs)
+                return _make_function_call_key(fn, args, kwargs, version)
 
         def inner(*args, **kwargs):
             return cache_lookup_with_fallback(
                 make_key(*args, **kwargs),
                 lambda: fn(*args, **kwargs),
                 make_ttl(),
+                stale_ttl,
             )
         return inner
     return outer
 
 
-def _make_function_call_key(fn, args, kwargs):
+def _make_function_call_key(fn, args, kwargs, version=1):
     """Return a key for a cached function call."""
-    return (
-        '{fn.__module__}.{fn.__qualname__}'.format(fn=fn),
+    return KeyFamily(
+        '{fn.__module__}.{fn.__qualname__}'.format(fn=fn), version,
+    ).key(
         tuple(args),
         tuple((k, v) for k, v in sorted(kwargs.items())),
     )
 
 
-def retry(n, exceptions):
+def retry(n, exceptions, backoff=0, max_backoff=None, jitter=True):
     """A handy decorator which will retry a function call a fixed number
     of times should it fail by raising an exception.
 
     Only exceptions of the specified type (or types) will trigger a
     retry. If the function raises an exception on the final try, the
     exception is not caught.
+
+    If `backoff` is given, the k-th retry waits up to `backoff * 2**k`
+    seconds (capped at `max_backoff`). With `jitter`, the wait is picked
+    uniformly from zero to that bound, so that clients which failed
+    together don't all retry together.
     """
     if isinstance(exceptions, (list, set)):
         exceptions = tuple(exceptions)
     elif not isinstance(exceptions, tuple):
         exceptions = (exceptions,)
 
+    rand = random.Random()
+
+    def delay(attempt):
+        bound = backoff * 2 ** attempt
+        if max_backoff is not None:
+            bound = min(bound, max_backoff)
+        return rand.uniform(0, bound) if jitter else bound
+
     def outer(fn):
         def inner(*args, **kwargs):
-            for _ in range(n - 1):
+            for attempt in range(n - 1):
                 try:
                     return fn(*args, **kwargs)
                 except exceptions:
+                    if backoff:
+                        time.sleep(delay(attempt))
                     continue
             # Don't catch on the last call
             return fn(*args, **kwargs)
@@ -123,12 +865,23 @@ def cache_lookup_only(key):
     This is good for when a function already caches its return value
     somewhere in its body, or for providing a default value for a value
     that is supposed to be cached by a worker process.
+
+    If the function stores its value with a `stale_ttl` (see
+    `cache_set`), stale values are returned immediately and the function
+    is called in the background to refresh them.
     """
     def outer(fn):
         def inner(*args, **kwargs):
+            k = key(*args, **kwargs)
             try:
-                return cache_lookup(key(*args, **kwargs))
+                result, is_stale = _cache_lookup_entry(k)
             except KeyError:
-                return fn(*args, **kwargs)
+                with timed(k, 'fallback_ms'):
+                    return fn(*args, **kwargs)
+            if is_stale:
+                _refresh_in_background(k, lambda: fn(*args, **kwargs))
+            return result
+        # Callers doing their own (e.g. batched) lookups need the original
+        inner.uncached = fn
         return inner
     return outer
@@ -0,0 +1,122 @@
+import logging
+import time
+import uuid
+
+from django.core.cache import cache as django_cache
+
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit is open."""
+
+
+class CircuitBreaker:
+    """A circuit breaker around calls to a remote service, with its
+    state shared by all processes through the cache.
+
+    While closed, calls go through and failures are counted. After
+    `failure_threshold` failures within `failure_window` seconds the
+    circuit opens, and calls fail immediately with `CircuitOpenError`
+    for `reset_timeout` seconds. After that, a single call across all
+    processes is let through as a probe: if it succeeds the circuit
+    closes, otherwise it stays open for another `reset_timeout`.
+
+    Only exceptions for which `is_failure(e)` is true are counted; by
+    default that's all of them.
+
+    Can be used as a decorator.
+    """
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=5,
+        failure_window=60,
+        reset_timeout=30,
+        is_failure=lambda e: True,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+
+    def _key(self, suffix):
+        return 'circuit:{}:{}'.format(self.name, suffix)
+
+    @property
+    def is_open(self):
+        return django_cache.get(self._key('open_until')) is not None
+
+    def _before_call(self):
+        """Checks whether a call may go ahead, returning a probe token if
+        the call is a probe, and raising if the circuit is open."""
+        open_until = django_cache.get(self._key('open_until'))
+        if open_until is None:
+            return None
+        if time.time() < open_until:
+            raise CircuitOpenError('Circuit {} is open.'.format(self.name))
+
+        # Half-open: let exactly one caller through to probe the service
+        token = uuid.uuid4().hex
+        if django_cache.add(self._key('probe'), token, self.reset_timeout):
+            _logger.info('Probing circuit {}'.format(self.name))
+            return token
+        raise CircuitOpenError('Circuit {} is open.'.format(self.name))
+
+    def _record_success(self, probe):
+        if probe:
+            _logger.info('Closing circuit {}'.format(self.name))
+            django_cache.delete_many([
+                self._key('open_until'), self._key('failures'), self._key('probe'),
+            ])
+
+    def _record_failure(self, probe):
+        if probe:
+            self._open()
+            django_cache.delete(self._key('probe'))
+            return
+
+        failures_key = self._key('failures')
+        if django_cache.add(failures_key, 1, self.failure_window):
+            failures = 1
+        else:
+            try:
+                failures = django_cache.incr(failures_key)
+            except ValueError:
+                # Expired in between
+                failures = 1
+        if failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        _logger.warning('Opening circuit {} for {} seconds'.format(
+            self.name, self.reset_timeout,
+        ))
+        # Keep the state long enough to still be there when probing
+        django_cache.set(
+            self._key('open_until'),
+            time.time() + self.reset_timeout,
+            self.reset_timeout + self.failure_window,
+        )
+
+    def call(self, fn, *args, **kwargs):
+        probe = self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self._record_failure(probe)
+            elif probe:
+                # The service answered, just not with what we wanted
+                self._record_success(probe)
+            raise
+        self._record_success(probe)
+        return result
+
+    def __call__(self, fn):
+        def inner(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return inner
@@ -5,6 +5,8 @@ from textwrap import dedent
 from django.shortcuts import render
 
 import scifiweb.news.blog as blog
+from scifiweb.page_cache import BLOG_PAGES
+from scifiweb.page_cache import cache_response
 
 
 class Member(namedtuple('Member', ('id', 'name', 'roles', 'bio'))):
@@ -241,6 +243,8 @@ MEMBERS = (
 MEMBERS_MAP = {member.id: member for member in MEMBERS}
 
 
+# Short-lived, so the members shown still change every so often
+@cache_response(60, family=BLOG_PAGES)
 def home(request):
     return render(
         request,
@@ -248,6 +252,6 @@ def home(request):
         {
             'full_title': 'Project SCIFI',
             'members': random.sample(MEMBERS, 4),
-            'posts': blog.get_posts(per_page=5),
+            'posts': blog.get_post_summaries({'per_page': 5}),
         },
     )
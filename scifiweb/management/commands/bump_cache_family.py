@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from scifiweb.caching import KeyFamily
+
+
+class Command(BaseCommand):
+    help = (
+        'Invalidates every cache key in the given families, e.g. '
+        'wp_post_by_id, by bumping their generation.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('families', nargs='+', metavar='family')
+
+    def handle(self, *args, **options):
+        for name in options['families']:
+            generation = KeyFamily(name).bump()
+            self.stdout.write('{}: generation {}'.format(name, generation))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from scifiweb.cache_stats import aggregate
+from scifiweb.cache_stats import collect_snapshots
+from scifiweb.cache_stats import summarize
+
+
+COLUMNS = (
+    ('family', 'Family', '{}'),
+    ('lookups', 'Lookups', '{}'),
+    ('hit_rate', 'Hit rate', '{:.0%}'),
+    ('local_hits', 'Local', '{}'),
+    ('stale_hits', 'Stale', '{}'),
+    ('get_ms_mean', 'Get ms', '{:.2f}'),
+    ('fallback_ms_mean', 'Fallback ms', '{:.1f}'),
+    ('fallback_ms_p95', 'Fallback p95', '<{}'),
+    ('value_bytes_mean', 'Bytes', '{:.0f}'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Shows cache hit rates and latencies aggregated over all workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Print the raw summary as JSON.',
+        )
+
+    def handle(self, *args, **options):
+        snapshots = collect_snapshots()
+        rows = summarize(aggregate(snapshots))
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        self.stdout.write('Workers: {}'.format(len(snapshots)))
+        table = [[title for _, title, _ in COLUMNS]]
+        for row in rows:
+            table.append([
+                fmt.format(row[name]) if row[name] is not None else '-'
+                for name, _, fmt in COLUMNS
+            ])
+        widths = [max(len(line[i]) for line in table) for i in range(len(COLUMNS))]
+        for line in table:
+            self.stdout.write('  '.join(
+                cell.ljust(width) for cell, width in zip(line, widths)
+            ))
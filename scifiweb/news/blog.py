@@ -1,30 +1,134 @@
 import datetime
+import functools
 import logging
+import os
+import threading
+import time
 from collections import namedtuple
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 
 import requests
-from cached_property import cached_property
+from django.conf import settings
 from django.core.cache import cache as django_cache
 from django.shortcuts import reverse
 from django.utils.safestring import mark_safe
+from requests.adapters import HTTPAdapter
 
+from scifiweb.caching import cache_delete
+from scifiweb.caching import cache_lookup
+from scifiweb.caching import cache_lookup_many
 from scifiweb.caching import cache_lookup_only
+from scifiweb.caching import cache_set
+from scifiweb.caching import cache_set_many
+from scifiweb.caching import KeyFamily
 from scifiweb.caching import retry
+from scifiweb.circuit import CircuitBreaker
+from scifiweb.news import codec
+from scifiweb.news import content
+from scifiweb.news.signals import post_changed
 from scifiweb.utils import pathappend
 
 
 _logger = logging.getLogger(__name__)
 
 
-BLOG_API_URL = 'https://wp.projectscifi.org/wp-json/wp/v2/'
-
 API_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
 
-# Universal among API types
-_CACHE_TTL = 600
+# Universal among API types. Changes normally reach the cache much sooner
+# than this, through the webhook (see `refresh_post`) or the mirror
+# worker's syncs.
+_CACHE_TTL = 6 * 60 * 60
+# How long past `_CACHE_TTL` an object may still be served while it is
+# refreshed in the background
+_CACHE_STALE_TTL = 24 * 60 * 60
+# How long to remember that something doesn't exist, so that requests for
+# junk ids and slugs don't all go to WordPress
+_NOT_FOUND_TTL = 60
+
+# The most results WordPress returns per page
+_MAX_PER_PAGE = 100
+# Posts modified this close to the last sync are fetched again, in case
+# they were saved within the same second it saw
+_SYNC_OVERLAP = datetime.timedelta(seconds=1)
+# How long after the mirror worker last wrote an unchanged post it writes
+# it again, well before it would go stale
+_RENEW_AGE = _CACHE_TTL // 2
+
+
+def _posts_from_api_objects(cls, objs):
+    """Constructs posts or post summaries from a list of WordPress API
+    JSON objects, resolving the authors and terms of all of them
+    together with a single batched cache lookup."""
+    users, terms = resolve_references(
+        {int(obj['author']) for obj in objs},
+        {int(id) for obj in objs for id in obj['categories']},
+        {int(id) for obj in objs for id in obj['tags']},
+    )
+
+    posts = []
+    for obj in objs:
+        fields = dict(
+            id=obj['id'],
+            slug=obj['slug'],
+            date=parse_api_datetime(obj['date']),
+            modified=parse_api_datetime(obj['modified']),
+            title=obj['title']['rendered'],
+            author=users[int(obj['author'])],
+            excerpt=content.process(obj['excerpt']['rendered']),
+            categories=[terms[int(id)] for id in obj['categories']],
+            tags=[terms[int(id)] for id in obj['tags']],
+        )
+        if 'content' in cls._fields:
+            fields['content'] = content.process(obj['content']['rendered'])
+        posts.append(cls(**fields))
+    return posts
+
+
+def parse_api_datetime(value):
+    """Parses a datetime in `API_DATETIME_FORMAT`, several times faster
+    than `strptime`."""
+    if len(value) != 19 or value[4] != '-' or value[7] != '-' or value[10] != 'T':
+        return datetime.datetime.strptime(value, API_DATETIME_FORMAT)
+    return datetime.datetime(
+        int(value[0:4]), int(value[5:7]), int(value[8:10]),
+        int(value[11:13]), int(value[14:16]), int(value[17:19]),
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _permalink(date, slug):
+    return reverse('post', args=(
+        '{:04d}'.format(date.year),
+        '{:02d}'.format(date.month),
+        '{:02d}'.format(date.day),
+        slug,
+    ))
+
+
+def _safe_field(fields, name):
+    """Returns a property for a namedtuple field holding HTML, which is
+    only marked safe when read, rather than copied into a `SafeText`
+    whenever a post is built."""
+    index = fields.index(name)
+    return property(
+        lambda self: mark_safe(tuple.__getitem__(self, index)),
+        doc='HTML of the post {}'.format(name),
+    )
+
+
+class _PostMixin:
+    # Posts are plain tuples, without an instance dict
+    __slots__ = ()
+
+    @property
+    def permalink(self):
+        """Returns the permalink URL for a post."""
+        return _permalink(self.date.date(), self.slug)
 
 
-class Post(namedtuple('Post', (
+_POST_FIELDS = (
     'id',
     'slug',
     'date',
@@ -35,43 +139,76 @@ class Post(namedtuple('Post', (
     'excerpt',
     'categories',
     'tags',
-))):
+)
+_POST_SUMMARY_FIELDS = tuple(field for field in _POST_FIELDS if field != 'content')
+
+
+class Post(_PostMixin, namedtuple('Post', _POST_FIELDS)):
     """A blog post.
 
     Blog posts are retrieved from the WordPress API or and cached locally.
     """
+    __slots__ = ()
+
+    content = _safe_field(_POST_FIELDS, 'content')
+    excerpt = _safe_field(_POST_FIELDS, 'excerpt')
+
     @staticmethod
     def from_api_object(obj):
         """Constructs a post from a WordPress API JSON object."""
-        post = Post(
-            id=obj['id'],
-            slug=obj['slug'],
-            date=datetime.datetime.strptime(obj['date'], API_DATETIME_FORMAT),
-            modified=datetime.datetime.strptime(obj['modified'], API_DATETIME_FORMAT),
-            title=obj['title']['rendered'],
-            author=get_user_by_id(int(obj['author'])),
-            content=mark_safe(obj['content']['rendered']),
-            excerpt=mark_safe(obj['excerpt']['rendered']),
-            categories=[get_category_by_id(int(id)) for id in obj['categories']],
-            tags=[get_tag_by_id(int(id)) for id in obj['tags']],
-        )
+        return Post.from_api_objects([obj])[0]
 
-        # Update caches
-        django_cache.set(('wp_post_by_id', post.id), post, _CACHE_TTL)
-        django_cache.set(('wp_post_id_by_slug', post.slug), post.id, _CACHE_TTL)
+    @staticmethod
+    def from_api_objects(objs):
+        """Constructs posts from a list of WordPress API JSON objects.
 
-        return post
+        The authors and terms of all posts are resolved together with a
+        single batched cache lookup, and the posts and their summaries
+        are cached in a single pipelined write.
+        """
+        posts = _posts_from_api_objects(Post, objs)
+        cache_set_many(_post_cache_entries(posts), _CACHE_TTL, _CACHE_STALE_TTL)
+        return posts
 
-    @cached_property
-    def permalink(self):
-        """Returns the permalink URL for a post."""
-        date = self.date.date()
-        return reverse('post', args=(
-            '{:04d}'.format(date.year),
-            '{:02d}'.format(date.month),
-            '{:02d}'.format(date.day),
-            self.slug,
-        ))
+    def summary(self):
+        """Returns the summary of this post."""
+        return PostSummary(**{field: getattr(self, field) for field in PostSummary._fields})
+
+
+class PostSummary(_PostMixin, namedtuple('PostSummary', _POST_SUMMARY_FIELDS)):
+    """The parts of a blog post shown in lists of posts, which is all but
+    its content.
+
+    Summaries are fetched with only the fields they need, and cached
+    separately from full posts, which keeps lists of posts cheap.
+    """
+    __slots__ = ()
+
+    excerpt = _safe_field(_POST_SUMMARY_FIELDS, 'excerpt')
+
+    # Fields to ask the API for, with `_fields`
+    API_FIELDS = 'id,slug,date,modified,title,author,excerpt,categories,tags'
+
+    @staticmethod
+    def from_api_objects(objs):
+        """Constructs post summaries from a list of WordPress API JSON
+        objects, caching them in a single pipelined write."""
+        summaries = _posts_from_api_objects(PostSummary, objs)
+        cache_set_many(
+            {POST_SUMMARY_BY_ID.key(summary.id): summary for summary in summaries},
+            _CACHE_TTL, _CACHE_STALE_TTL,
+        )
+        return summaries
+
+
+def _post_cache_entries(posts):
+    """Returns the cache entries under which posts can be found."""
+    entries = {}
+    for post in posts:
+        entries[POST_BY_ID.key(post.id)] = post
+        entries[POST_SUMMARY_BY_ID.key(post.id)] = post.summary()
+        entries[POST_ID_BY_SLUG.key(post.slug)] = post.id
+    return entries
 
 
 class User(namedtuple('User', (
@@ -80,12 +217,26 @@ class User(namedtuple('User', (
     'name',
 ))):
     """Represents a WordPress user, i.e. the author of a post."""
+    __slots__ = ()
+
     @staticmethod
     def from_api_object(obj):
         """Constructs a user from a WordPress API JSON object."""
-        user = User(id=obj['id'], name=obj['name'], slug=obj['slug'])
-        django_cache.set(('wp_user_by_id', user.id), user, _CACHE_TTL)
-        return user
+        return User.from_api_objects([obj])[0]
+
+    @staticmethod
+    def from_api_objects(objs):
+        """Constructs users from a list of WordPress API JSON objects,
+        caching them in a single pipelined write."""
+        users = [
+            User(id=obj['id'], name=obj['name'], slug=obj['slug'])
+            for obj in objs
+        ]
+        cache_set_many(
+            {USER_BY_ID.key(user.id): user for user in users},
+            _CACHE_TTL, _CACHE_STALE_TTL,
+        )
+        return users
 
 
 class Term(namedtuple('Term', (
@@ -101,44 +252,377 @@ class Term(namedtuple('Term', (
     "taxonomy" field which indicates the type of term. Every post has
     at least one category, but may have zero or more tags.
     """
+    __slots__ = ()
+
     @staticmethod
     def from_api_object(obj):
         """Constructs a term from a WordPress API JSON object."""
-        term = Term(
-            id=obj['id'],
-            name=obj['name'],
-            slug=obj['slug'],
-            taxonomy=obj['taxonomy'],
+        return Term.from_api_objects([obj])[0]
+
+    @staticmethod
+    def from_api_objects(objs):
+        """Constructs terms from a list of WordPress API JSON objects,
+        caching them in a single pipelined write."""
+        terms = [
+            Term(
+                id=obj['id'],
+                name=obj['name'],
+                slug=obj['slug'],
+                taxonomy=obj['taxonomy'],
+            )
+            for obj in objs
+        ]
+        cache_set_many(
+            {TERM_BY_ID.key(term.id): term for term in terms},
+            _CACHE_TTL, _CACHE_STALE_TTL,
+        )
+        return terms
+
+
+def resolve_references(user_ids, category_ids, tag_ids, fetch=True):
+    """Looks up the authors and terms referenced by some posts,
+    returning a pair of dicts `(users, terms)` keyed by id.
+
+    Everything is tried in one batched cache lookup. Misses are fetched
+    with `include[]` list queries, which run concurrently. Stale hits are
+    refreshed in the background just like the individual getters would.
+
+    Unless `fetch` is true, only the cache is used, and KeyError is
+    raised if anything isn't cached. That's for decoding posts, so the
+    lookups aren't counted in the cache stats either: the lookup of the
+    post was.
+    """
+    # Cache key -> (kind, id, getter, list getter)
+    references = {}
+    for key, id in zip(USER_BY_ID.keys(user_ids), user_ids):
+        references[key] = ('user', id, get_user_by_id, get_users)
+    for key, id in zip(TERM_BY_ID.keys(tag_ids), tag_ids):
+        references[key] = ('term', id, get_tag_by_id, get_tags)
+    for key, id in zip(TERM_BY_ID.keys(category_ids), category_ids):
+        references[key] = ('term', id, get_category_by_id, get_categories)
+
+    def refresh(key):
+        _, id, getter, _ = references[key]
+        getter.uncached(id)
+
+    hits = cache_lookup_many(list(references), refresh=refresh if fetch else None, record=fetch)
+    if not fetch and len(hits) < len(references):
+        raise KeyError('Not cached: {}'.format(set(references) - set(hits)))
+
+    missing = {}
+    for key, (_, id, _, list_getter) in references.items():
+        if key not in hits:
+            missing.setdefault(list_getter, []).append(id)
+    fetched = {}
+    for objs in run_concurrently([
+        functools.partial(list_getter, {'include[]': chunk, 'per_page': len(chunk)})
+        for list_getter, ids in missing.items()
+        for chunk in _chunks(ids)
+    ]):
+        for obj in objs:
+            family = USER_BY_ID if isinstance(obj, User) else TERM_BY_ID
+            fetched[family.key(obj.id)] = obj
+
+    users = {}
+    terms = {}
+    for key, (kind, id, _, _) in references.items():
+        # Objects which no longer exist resolve to None
+        value = hits[key] if key in hits else fetched.get(key)
+        if kind == 'user':
+            users[id] = value
+        else:
+            terms[id] = value
+    return users, terms
+
+
+def _chunks(ids):
+    """Splits a list of ids into pages small enough for one query."""
+    return [ids[start:start + _MAX_PER_PAGE] for start in range(0, len(ids), _MAX_PER_PAGE)]
+
+
+class PostCodec:
+    """Encodes posts for the shared cache.
+
+    Authors and terms are stored by id and looked up again when decoding,
+    so they are neither duplicated in every post nor left out of date.
+    They're only looked up in the cache: posts referring to anything which
+    isn't cached fail to decode, and so are cache misses.
+    """
+    KIND = b'P'
+    TYPE = Post
+
+    @classmethod
+    def dumps(cls, post):
+        record = []
+        for field in cls.TYPE._fields:
+            value = getattr(post, field)
+            if field in ('date', 'modified'):
+                value = codec.datetime_to_int(value)
+            elif field == 'author':
+                value = value.id if value else None
+            elif field in ('content', 'excerpt'):
+                value = str(value)
+            elif field in ('categories', 'tags'):
+                value = [term.id for term in value if term]
+            record.append(value)
+        return codec.pack(cls.KIND, record)
+
+    @classmethod
+    def loads(cls, data):
+        return cls.loads_many([data])[0]
+
+    @classmethod
+    def loads_many(cls, datas):
+        records = [
+            dict(zip(cls.TYPE._fields, codec.unpack(cls.KIND, data)))
+            for data in datas
+        ]
+        # Decoding happens during cache lookups, which mustn't call
+        # WordPress; posts whose references were evicted are misses
+        users, terms = resolve_references(
+            {record['author'] for record in records if record['author'] is not None},
+            {id for record in records for id in record['categories']},
+            {id for record in records for id in record['tags']},
+            fetch=False,
         )
-        django_cache.set(('wp_term_by_id', term.id), term, _CACHE_TTL)
-        return term
+        for record in records:
+            record['date'] = codec.int_to_datetime(record['date'])
+            record['modified'] = codec.int_to_datetime(record['modified'])
+            record['author'] = users.get(record['author'])
+            for field in ('categories', 'tags'):
+                record[field] = [terms[id] for id in record[field]]
+        return [cls.TYPE(**record) for record in records]
+
+
+class PostSummaryCodec(PostCodec):
+    """Encodes post summaries for the shared cache."""
+    KIND = b'S'
+    TYPE = PostSummary
 
 
-@retry(5, (requests.ConnectionError, requests.Timeout))
+class UserCodec:
+    """Encodes users for the shared cache."""
+
+    @staticmethod
+    def dumps(user):
+        return codec.pack(b'U', [user.id, user.slug, user.name])
+
+    @staticmethod
+    def loads(data):
+        return User(*codec.unpack(b'U', data))
+
+
+class TermCodec:
+    """Encodes terms for the shared cache."""
+
+    @staticmethod
+    def dumps(term):
+        return codec.pack(b'T', [term.id, term.slug, term.name, term.taxonomy])
+
+    @staticmethod
+    def loads(data):
+        return Term(*codec.unpack(b'T', data))
+
+
+# Bump a family's version whenever the corresponding type or its codec
+# changes shape. Pages are cached in front of these, so processes don't
+# keep copies which could outlive the pages being invalidated.
+POST_BY_ID = KeyFamily('wp_post_by_id', 3, PostCodec, local=False)
+POST_SUMMARY_BY_ID = KeyFamily('wp_post_summary_by_id', 2, PostSummaryCodec, local=False)
+POST_ID_BY_SLUG = KeyFamily('wp_post_id_by_slug', 1, local=False)
+USER_BY_ID = KeyFamily('wp_user_by_id', 2, UserCodec, local=False)
+TERM_BY_ID = KeyFamily('wp_term_by_id', 2, TermCodec, local=False)
+# The `ETag` and `Last-Modified` headers of API objects
+VALIDATOR_BY_ENDPOINT_AND_ID = KeyFamily('wp_validator', 1)
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Returns this process's HTTP session for the WordPress API.
+
+    The session keeps connections alive between requests, so most cache
+    misses skip the TCP and TLS handshakes. A fresh session is made
+    after a fork so that processes never share sockets.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.BLOG_API_POOL_CONNECTIONS,
+                pool_maxsize=settings.BLOG_API_POOL_MAXSIZE,
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+class NotModified(Exception):
+    """Raised by conditional queries when nothing changed."""
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_executor_thread = threading.local()
+
+
+def _get_executor():
+    """Returns this process's thread pool for concurrent API queries,
+    recreating it after a fork. It has as many threads as the session
+    keeps connections."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=settings.BLOG_API_POOL_MAXSIZE)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _in_executor(call):
+    _executor_thread.active = True
+    try:
+        return call()
+    finally:
+        _executor_thread.active = False
+
+
+def run_concurrently(calls):
+    """Calls each of a list of functions concurrently and returns their
+    results in order. The first exception raised by any of them is
+    reraised.
+
+    The first call runs in the calling thread and the others on a
+    shared thread pool. Calls made from the pool's own threads run one
+    after another instead, so that they never wait on the pool they're
+    occupying.
+    """
+    if len(calls) <= 1 or getattr(_executor_thread, 'active', False):
+        return [call() for call in calls]
+    futures = [
+        _get_executor().submit(_in_executor, call) for call in calls[1:]
+    ]
+    try:
+        first = calls[0]()
+    except Exception:
+        # Don't leave the others running unobserved
+        wait(futures)
+        raise
+    return [first] + [future.result() for future in futures]
+
+
+class Loader:
+    """Loads the data a single request needs concurrently, calling each
+    distinct function and arguments only once.
+
+    Views start every lookup they'll need up front with `load`, and wait
+    on the futures once they need the results, so they wait about as
+    long as the slowest lookup rather than the sum of all of them. Make
+    a new loader for every request, so nothing is shared between them.
+
+    Loads from the shared thread pool's own threads run right away, as
+    with `run_concurrently`.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def load(self, fn, *args):
+        """Starts calling `fn(*args)`, unless it was already, and returns
+        a future of its result."""
+        key = (fn, args)
+        inline = getattr(_executor_thread, 'active', False)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+            if inline:
+                future = Future()
+            else:
+                future = _get_executor().submit(_in_executor, functools.partial(fn, *args))
+            self._futures[key] = future
+
+        if inline:
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+
+def _is_upstream_failure(e):
+    """Connection problems and server errors count against the circuit
+    breaker; client errors such as 404s don't."""
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code >= 500
+    return isinstance(e, requests.RequestException)
+
+
+# Stop calling WordPress for a while when it keeps failing, rather than
+# tying up every worker in retries. Cached (including stale) objects
+# are still served in the meantime.
+_circuit = CircuitBreaker('wordpress', is_failure=_is_upstream_failure)
+
+
+@_circuit
+@retry(
+    3, (requests.ConnectionError, requests.Timeout),
+    backoff=0.1, max_backoff=1,
+)
 def query_endpoint(endpoint, params=None, **kwargs):
     """Performs a generic query on an API endpoint.
 
     The `base_api_url` kwarg overrides the API location.
 
     If the `constructor` kwarg is provided, it will be called on each
-    element in the output. Otherwise, the raw dict or list will be
-    returned.
+    element in the output. If the output is a list and the
+    `list_constructor` kwarg is provided, it will be called on the whole
+    list instead. Otherwise, the raw dict or list will be returned.
 
     If the `headers` kwarg is `True`, then the output will be a tuple
     `(output, headers)` containing the response headers.
+
+    If the `validator` kwarg is given, as a pair `(etag, last_modified)`
+    of the headers of an earlier response, the request is conditional,
+    and `NotModified` is raised if the output would be the same.
+
+    Raises `CircuitOpenError` without making a request if WordPress has
+    been failing recently.
     """
     if not params:
         params = {}
 
-    url = pathappend(kwargs.get('base_api_url', BLOG_API_URL), endpoint)
+    url = pathappend(kwargs.get('base_api_url', settings.BLOG_API_URL), endpoint)
     _logger.debug('Hit endpoint: {}'.format(url))
 
-    response = requests.get(url, params, timeout=1)
+    request_headers = {}
+    etag, last_modified = kwargs.get('validator') or (None, None)
+    if etag:
+        request_headers['If-None-Match'] = etag
+    if last_modified:
+        request_headers['If-Modified-Since'] = last_modified
+
+    response = _get_session().get(
+        url, params=params, headers=request_headers,
+        timeout=settings.BLOG_API_TIMEOUT,
+    )
+    if response.status_code == 304:
+        raise NotModified(url)
     response.raise_for_status()
     output = response.json()
 
     constructor = kwargs.get('constructor')
-    if constructor:
+    list_constructor = kwargs.get('list_constructor')
+    if list_constructor and isinstance(output, list):
+        result = list_constructor(output)
+    elif constructor:
         if isinstance(output, list):
             result = [constructor(obj) for obj in output]
         else:
@@ -152,12 +636,18 @@ def query_endpoint(endpoint, params=None, **kwargs):
         return result
 
 
-def query_keyed_endpoint(endpoint, key, params=None, **kwargs):
+# WordPress doesn't show trashed or unpublished posts to anonymous
+# clients, rather than saying they don't exist
+_POST_GONE_STATUSES = (401, 403, 404, 410)
+
+
+def query_keyed_endpoint(endpoint, key, params=None, gone=(404,), **kwargs):
     """Queries an API endpoint that takes a key in the URL, e.g. a
     numeric id.
 
-    If the specified endpoint does not exist (i.e. returns a 404),
-    returns None. Keyword arguments are passed to `query_endpoint`.
+    If the specified endpoint does not exist (i.e. returns a 404, or
+    another of the `gone` statuses), returns None. Keyword arguments are
+    passed to `query_endpoint`.
     """
     try:
         return query_endpoint(
@@ -166,12 +656,120 @@ def query_keyed_endpoint(endpoint, key, params=None, **kwargs):
             **kwargs
         )
     except requests.HTTPError as e:
-        if e.response.status_code == 404:
+        if e.response is not None and e.response.status_code in gone:
             return None
         else:
             raise
 
 
+def _cached_for_revalidation(key):
+    """Returns the cached (possibly stale) value of a key, or None.
+
+    This runs after the key's lookup missed or was stale, which was
+    counted already.
+    """
+    try:
+        return cache_lookup(key, record=False)
+    except KeyError:
+        return None
+
+
+def _revalidate_post(family, id):
+    """Checks whether the cached post or post summary with an id is still
+    current, with a request for nothing but its modification time. If
+    it is, caches it for another TTL and returns it; otherwise returns
+    None."""
+    cached = _cached_for_revalidation(family.key(id))
+    if cached is None:
+        return None
+    current = query_keyed_endpoint('posts', id, {'_fields': 'modified'}, gone=_POST_GONE_STATUSES)
+    if current is None or cached.modified != parse_api_datetime(current['modified']):
+        return None
+
+    if isinstance(cached, Post):
+        entries = _post_cache_entries([cached])
+    else:
+        entries = {family.key(id): cached}
+    cache_set_many(entries, _CACHE_TTL, _CACHE_STALE_TTL)
+    return cached
+
+
+def _query_revalidating(endpoint, id, family, constructor, cache_missing=True):
+    """Queries an object by id, like `query_keyed_endpoint`, but
+    conditionally if a copy is cached along with the `ETag` or
+    `Last-Modified` of the response it came from. If it hasn't changed,
+    it's cached for another TTL instead of being rebuilt.
+
+    Objects which don't exist are cached as None, unless `cache_missing`
+    is false, e.g. because it may exist at another endpoint under the
+    same key."""
+    key = family.key(id)
+    validator_key = VALIDATOR_BY_ENDPOINT_AND_ID.key(endpoint, id)
+    cached = _cached_for_revalidation(key)
+    validator = _cached_for_revalidation(validator_key) if cached is not None else None
+
+    try:
+        result = query_keyed_endpoint(
+            endpoint, id, constructor=constructor, headers=True, validator=validator,
+        )
+    except NotModified:
+        cache_set(key, cached, _CACHE_TTL, _CACHE_STALE_TTL)
+        result = (cached, {'ETag': validator[0], 'Last-Modified': validator[1]})
+    if result is None:
+        if cache_missing:
+            cache_set(key, None, _NOT_FOUND_TTL)
+        return None
+
+    obj, headers = result
+    validator = (headers.get('ETag'), headers.get('Last-Modified'))
+    if any(validator):
+        cache_set(validator_key, validator, _CACHE_TTL + _CACHE_STALE_TTL)
+    return obj
+
+
+def iter_pages(getter, params=None, per_page=_MAX_PER_PAGE, prefetch=False, **kwargs):
+    """Yields every page of results of a list query, e.g. `get_posts` or
+    `get_tags`, as a list.
+
+    If `prefetch` is true, each page after the first is fetched in the
+    background while the one before it is being consumed.
+
+    Extra kwargs will be passed to the getter.
+    """
+    def fetch(page):
+        page_params = dict(params or {})
+        page_params.update({'page': page, 'per_page': per_page})
+        return getter(page_params, headers=True, **kwargs)
+
+    # Waiting on the pool from one of its own threads could deadlock it
+    prefetch = prefetch and not getattr(_executor_thread, 'active', False)
+
+    page = 1
+    results, headers = fetch(page)
+    while page < int(headers.get('X-WP-TotalPages', 1)):
+        if prefetch:
+            next_page = _get_executor().submit(_in_executor, functools.partial(fetch, page + 1))
+        yield results
+        page += 1
+        results, headers = next_page.result() if prefetch else fetch(page)
+    yield results
+
+
+def iter_posts(params=None, page_size=_MAX_PER_PAGE):
+    """Yields every post matching a query, in the order WordPress lists
+    them.
+
+    Pages of `page_size` posts are fetched as they're needed, each one
+    while the one before is being consumed, so no more than about two
+    pages are held at once.
+
+    >>> sum(1 for post in iter_posts({'categories[]': [1]}))
+    42
+    """
+    for page in iter_pages(get_posts, params, per_page=page_size, prefetch=True):
+        yield from page
+
+
 def get_posts(params=None, **kwargs):
     """Performs a generic query to retrieve a list of posts.
 
@@ -183,10 +781,11 @@ def get_posts(params=None, **kwargs):
     if not params:
         params = {}
     kwargs.setdefault('constructor', Post.from_api_object)
+    kwargs.setdefault('list_constructor', Post.from_api_objects)
     return query_endpoint('posts', params, **kwargs)
 
 
-@cache_lookup_only(key=lambda id: ('wp_post_by_id', id))
+@cache_lookup_only(key=POST_BY_ID.key)
 def get_post_by_id(id):
     """Retrieves a post given its unique identifier as an integer.
 
@@ -195,20 +794,247 @@ def get_post_by_id(id):
     >>> get_post_by_id(1)
     Post(id=1, slug='hello-world', ...)
     """
-    return query_keyed_endpoint(
+    # Most refreshes find the stale copy unchanged
+    post = _revalidate_post(POST_BY_ID, id)
+    if post is not None:
+        return post
+
+    post = query_keyed_endpoint(
         'posts', id,
         constructor=Post.from_api_object,
+        gone=_POST_GONE_STATUSES,
+    )
+    if post is None:
+        # This also stops serving stale copies of a deleted post
+        cache_set_many(
+            {POST_BY_ID.key(id): None, POST_SUMMARY_BY_ID.key(id): None},
+            _NOT_FOUND_TTL,
+        )
+    return post
+
+
+def get_posts_by_ids(ids):
+    """Retrieves a list of posts given their ids, in the same order.
+
+    Cached posts are found with one batched lookup, and any others are
+    fetched with a single query. Posts which don't exist are None.
+    """
+    keys = {POST_BY_ID.key(id): id for id in ids}
+
+    def refresh(key):
+        get_post_by_id.uncached(keys[key])
+
+    hits = cache_lookup_many(list(keys), refresh=refresh)
+    posts = {keys[key]: post for key, post in hits.items()}
+
+    missing = [id for id in ids if id not in posts]
+    posts.update((post.id, post) for post in _fetch_posts(missing))
+    return [posts.get(id) for id in ids]
+
+
+def _fetch_posts(ids, getter=get_posts):
+    """Fetches posts (or, with `getter=get_post_summaries`, summaries) by
+    id from WordPress, with concurrent queries of up to 100 posts each."""
+    return [
+        post
+        for posts in run_concurrently([
+            functools.partial(getter, {'include[]': chunk, 'per_page': len(chunk)})
+            for chunk in _chunks(ids)
+        ])
+        for post in posts
+    ]
+
+
+def get_post_summaries(params=None, **kwargs):
+    """Like `get_posts`, but only fetches and returns post summaries.
+
+    Extra kwargs will be passed to `query_endpoint`.
+    """
+    params = dict(params or {})
+    params['_fields'] = PostSummary.API_FIELDS
+    kwargs.setdefault('constructor', lambda obj: PostSummary.from_api_objects([obj])[0])
+    kwargs.setdefault('list_constructor', PostSummary.from_api_objects)
+    return query_endpoint('posts', params, **kwargs)
+
+
+def get_post_summaries_by_ids(ids):
+    """Retrieves a list of post summaries given the ids of the posts, in
+    the same order. Summaries of posts which don't exist are None.
+
+    Cached summaries are found with one batched lookup, and any others
+    are fetched with a single query.
+    """
+    keys = {POST_SUMMARY_BY_ID.key(id): id for id in ids}
+
+    def refresh(key):
+        if _revalidate_post(POST_SUMMARY_BY_ID, keys[key]) is None:
+            _fetch_posts([keys[key]], get_post_summaries)
+
+    hits = cache_lookup_many(list(keys), refresh=refresh)
+    summaries = {keys[key]: summary for key, summary in hits.items()}
+
+    missing = [id for id in ids if id not in summaries]
+    summaries.update(
+        (summary.id, summary)
+        for summary in _fetch_posts(missing, get_post_summaries)
     )
+    return [summaries.get(id) for id in ids]
+
+
+def _get_post_ids(params=None, **kwargs):
+    """Lists the ids of posts, without fetching anything else."""
+    params = dict(params or {})
+    params['_fields'] = 'id'
+    kwargs.setdefault('list_constructor', lambda objs: [obj['id'] for obj in objs])
+    return query_endpoint('posts', params, **kwargs)
+
+
+class PostSync:
+    """Keeps the cached posts in step with WordPress incrementally.
+
+    The first sync fetches every post. After that, only posts modified
+    since the latest modification seen so far are fetched, and
+    deletions are found by counting posts, which only needs a listing of
+    all ids when the count is off. That listing also turns up posts which
+    were published without being modified, which are fetched as well. A
+    sync where nothing changed costs two small requests.
+
+    Only changed and deleted posts are written on each sync. Unchanged
+    posts are rewritten from the shared cache rather than refetched once
+    they're halfway through their TTL, so they stay fresh as long as
+    syncs keep running.
 
+    Changes aren't announced with `post_changed` until `notify()` is
+    called, so that whatever else is derived from the posts (e.g. the
+    search index) can be updated before pages are rendered again.
 
-@cache_lookup_only(key=lambda slug: ('wp_post_id_by_slug', slug))
+    `posts` seeds the state with objects having an `id`, `slug` and
+    `modified`, e.g. the documents of a search index, to skip the
+    initial full crawl.
+    """
+
+    def __init__(self, posts=()):
+        posts = list(posts)
+        self.slugs = {post.id: post.slug for post in posts}
+        self.modified = max((post.modified for post in posts), default=None)
+        # Posts already seen with `self.modified`, which are fetched again
+        # because of the overlap but aren't changes
+        self.seen = {post.id for post in posts if post.modified == self.modified}
+        # Post id -> when it was last written, by `time.monotonic()`
+        self.written = {}
+        # Post id (or None for all posts) -> slugs to announce as changed
+        self.pending = {}
+
+    def sync(self):
+        """Brings the cache up to date, returning a pair `(changed,
+        deleted)` of the posts created or modified and the ids of the
+        posts deleted since the last sync."""
+        full = self.modified is None
+        if full:
+            params = {}
+        else:
+            params = {
+                'modified_after': (self.modified - _SYNC_OVERLAP).strftime(API_DATETIME_FORMAT),
+                'orderby': 'modified',
+                'order': 'asc',
+            }
+        changed = [
+            post for post in iter_posts(params)
+            if not (post.modified == self.modified and post.id in self.seen)
+        ]
+
+        # Post id -> slugs before and after
+        changed_slugs = {}
+        now = time.monotonic()
+        self._record(changed, changed_slugs, now)
+
+        if full:
+            deleted = set(self.slugs) - {post.id for post in changed}
+        else:
+            deleted, appeared = self._compare_ids()
+            # Posts which became public without being modified since the
+            # last sync, e.g. scheduled ones
+            appeared_posts = _fetch_posts(sorted(appeared))
+            self._record(appeared_posts, changed_slugs, now)
+            changed.extend(appeared_posts)
+        deleted_slugs = {}
+        for id in deleted:
+            deleted_slugs[id] = self.slugs.pop(id)
+            self.written.pop(id, None)
+            cache_delete(POST_BY_ID.key(id))
+            cache_delete(POST_SUMMARY_BY_ID.key(id))
+            cache_delete(POST_ID_BY_SLUG.key(deleted_slugs[id]))
+
+        if full:
+            self.pending[None] = set()
+        else:
+            changed_slugs.update((id, {slug}) for id, slug in deleted_slugs.items())
+            for id, slugs in changed_slugs.items():
+                self.pending[id] = self.pending.get(id, set()) | slugs
+            self._renew([
+                id for id in self.slugs
+                if now - self.written.get(id, now - _RENEW_AGE) >= _RENEW_AGE
+            ])
+        return changed, deleted
+
+    def notify(self):
+        """Sends `post_changed` for every change found by the syncs since
+        the last call."""
+        pending, self.pending = self.pending, {}
+        for id, slugs in pending.items():
+            post_changed.send(sender=Post, post_id=id, slugs=slugs)
+
+    def _record(self, posts, changed_slugs, now):
+        """Updates the state for posts which were just written, adding
+        their slugs before and after to `changed_slugs`."""
+        for post in posts:
+            self.written[post.id] = now
+            old_slug = self.slugs.get(post.id)
+            changed_slugs[post.id] = {post.slug, old_slug} - {None}
+            if old_slug is not None and old_slug != post.slug:
+                cache_delete(POST_ID_BY_SLUG.key(old_slug))
+            self.slugs[post.id] = post.slug
+            if self.modified is None or post.modified > self.modified:
+                self.modified = post.modified
+                self.seen = set()
+            if post.modified == self.modified:
+                self.seen.add(post.id)
+
+    def _compare_ids(self):
+        """Returns a pair `(deleted, appeared)` of the ids of posts we
+        know of which are gone, and of posts we don't know of, going by
+        a listing of every id if the number of posts is off."""
+        _, headers = _get_post_ids({'per_page': 1}, headers=True)
+        if int(headers.get('X-WP-Total', 0)) == len(self.slugs):
+            return set(), set()
+        ids = {id for page in iter_pages(_get_post_ids, prefetch=True) for id in page}
+        return set(self.slugs) - ids, ids - set(self.slugs)
+
+    def _renew(self, ids):
+        """Rewrites unchanged posts, and their summaries, to restart
+        their TTLs, fetching any which were evicted."""
+        if not ids:
+            return
+        now = time.monotonic()
+        self.written.update((id, now) for id in ids)
+        keys = {POST_BY_ID.key(id): id for id in ids}
+        posts = [post for post in cache_lookup_many(list(keys)).values() if post is not None]
+        entries = _post_cache_entries(posts)
+        cache_set_many(entries, _CACHE_TTL, _CACHE_STALE_TTL)
+        _fetch_posts([id for key, id in keys.items() if key not in entries])
+
+
+@cache_lookup_only(key=POST_ID_BY_SLUG.key)
 def _get_post_id_by_slug(slug):
     """Retrieves the ID of the post with the given slug.
 
     This exists solely for caching purposes.
     """
     results = get_posts(params={'slug': slug})
-    return results[0].id if results else None
+    if not results:
+        cache_set(POST_ID_BY_SLUG.key(slug), None, _NOT_FOUND_TTL)
+        return None
+    return results[0].id
 
 
 def get_post_by_slug(slug):
@@ -219,7 +1045,63 @@ def get_post_by_slug(slug):
     >>> get_post_by_slug('hello-world')
     Post(id=1, slug='hello-world', ...)
     """
-    return get_post_by_id(_get_post_id_by_slug(slug))
+    id = _get_post_id_by_slug(slug)
+    return get_post_by_id(id) if id is not None else None
+
+
+def refresh_post(id):
+    """Replaces every cached copy of a post with its current version from
+    WordPress, e.g. right after it was edited, and returns it. Returns
+    None if the post was deleted (or unpublished), which is cached too.
+
+    Also asks the mirror worker to sync soon, so that the search index
+    catches up.
+    """
+    old = _cached_for_revalidation(POST_BY_ID.key(id))
+    # Fetching also caches the post, its summary and its slug
+    post = get_post_by_id.uncached(id)
+
+    slugs = {p.slug for p in (old, post) if p is not None}
+    if old is not None and (post is None or post.slug != old.slug):
+        cache_delete(POST_ID_BY_SLUG.key(old.slug))
+    request_sync()
+    post_changed.send(sender=Post, post_id=id, slugs=slugs)
+    return post
+
+
+def refresh_user(id):
+    """Replaces the cached copy of a user, and returns it."""
+    user = get_user_by_id.uncached(id)
+    post_changed.send(sender=User, post_id=None, slugs=set())
+    return user
+
+
+def refresh_term(id):
+    """Replaces the cached copy of a tag or category, and returns it."""
+    # Term ids are unique across taxonomies, so both are cached under the
+    # same key, which must only be marked missing if neither exists
+    term = _query_revalidating('tags', id, TERM_BY_ID, Term.from_api_object, cache_missing=False) \
+        or get_category_by_id.uncached(id)
+    post_changed.send(sender=Term, post_id=None, slugs=set())
+    return term
+
+
+_SYNC_REQUESTED_KEY = 'wp_sync_requested'
+
+
+def request_sync():
+    """Asks the mirror worker to sync with WordPress without waiting for
+    its next scheduled refresh."""
+    django_cache.set(_SYNC_REQUESTED_KEY, True, _CACHE_TTL)
+
+
+def take_sync_request():
+    """Returns whether a sync was requested, clearing the request."""
+    # Polled every second, so it bypasses the cache tiers and their stats
+    if django_cache.get(_SYNC_REQUESTED_KEY):
+        django_cache.delete(_SYNC_REQUESTED_KEY)
+        return True
+    return False
 
 
 def get_users(params=None, **kwargs):
@@ -229,10 +1111,11 @@ def get_users(params=None, **kwargs):
     https://developer.wordpress.org/rest-api/reference/users/#list-users
     """
     kwargs.setdefault('constructor', User.from_api_object)
+    kwargs.setdefault('list_constructor', User.from_api_objects)
     return query_endpoint('users', params, **kwargs)
 
 
-@cache_lookup_only(key=lambda id: ('wp_user_by_id', id))
+@cache_lookup_only(key=USER_BY_ID.key)
 def get_user_by_id(id):
     """Retrieves a user given its unique identifier as an integer.
 
@@ -241,7 +1124,7 @@ def get_user_by_id(id):
     >>> get_tag_by_id(1)
     User(id=1, slug='mmcallister', ...)
     """
-    return query_keyed_endpoint('users', id, constructor=User.from_api_object)
+    return _query_revalidating('users', id, USER_BY_ID, User.from_api_object)
 
 
 def get_tags(params=None, **kwargs):
@@ -251,10 +1134,11 @@ def get_tags(params=None, **kwargs):
     https://developer.wordpress.org/rest-api/reference/tags/#list-tags
     """
     kwargs.setdefault('constructor', Term.from_api_object)
+    kwargs.setdefault('list_constructor', Term.from_api_objects)
     return query_endpoint('tags', params, **kwargs)
 
 
-@cache_lookup_only(key=lambda id: ('wp_term_by_id', id))
+@cache_lookup_only(key=TERM_BY_ID.key)
 def get_tag_by_id(id):
     """Retrieves a tag given its unique identifier as an integer.
 
@@ -263,7 +1147,7 @@ def get_tag_by_id(id):
     >>> get_tag_by_id(1)
     Term(id=4, slug='test', ...)
     """
-    return query_keyed_endpoint('tags', id, constructor=Term.from_api_object)
+    return _query_revalidating('tags', id, TERM_BY_ID, Term.from_api_object)
 
 
 def get_categories(params=None, **kwargs):
@@ -273,10 +1157,11 @@ def get_categories(params=None, **kwargs):
     https://developer.wordpress.org/rest-api/reference/categories/#list-categorys
     """
     kwargs.setdefault('constructor', Term.from_api_object)
+    kwargs.setdefault('list_constructor', Term.from_api_objects)
     return query_endpoint('categories', params, **kwargs)
 
 
-@cache_lookup_only(key=lambda id: ('wp_term_by_id', id))
+@cache_lookup_only(key=TERM_BY_ID.key)
 def get_category_by_id(id):
     """Retrieves a category given its unique identifier as an integer.
 
@@ -285,7 +1170,4 @@ def get_category_by_id(id):
     >>> get_category_by_id(1)
     Term(id=1, slug='uncategorized', ...)
     """
-    return query_keyed_endpoint(
-        'categories', id,
-        constructor=Term.from_api_object
-    )
+    return _query_revalidating('categories', id, TERM_BY_ID, Term.from_api_object)
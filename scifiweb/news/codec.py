@@ -0,0 +1,58 @@
+import datetime
+import json
+import zlib
+
+
+FORMAT_VERSION = 1
+# Decompressing on every read costs more than the bytes saved on
+# smaller bodies, e.g. short posts and summaries
+COMPRESS_THRESHOLD = 4 * 1024
+
+# Posts are written far less often than they're read, but the fastest
+# level already gets most of the size reduction on HTML
+_COMPRESSION_LEVEL = 1
+
+_FLAG_COMPRESSED = 0x01
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class CodecError(ValueError):
+    """Raised for data in an unknown format, e.g. written by an older
+    version of this module."""
+
+
+def pack(kind, fields):
+    """Encodes a list of JSON-serializable fields as bytes.
+
+    The result is a one-byte `kind` tag identifying the type of object,
+    a format version byte, a flags byte, and the fields as a JSON array.
+    Bodies above `COMPRESS_THRESHOLD` bytes are zlib-compressed, which
+    mostly matters for post content.
+    """
+    body = json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    flags = 0
+    if len(body) > COMPRESS_THRESHOLD:
+        body = zlib.compress(body, _COMPRESSION_LEVEL)
+        flags |= _FLAG_COMPRESSED
+    return kind + bytes((FORMAT_VERSION, flags)) + body
+
+
+def unpack(kind, data):
+    """Decodes bytes made by `pack` back into a list of fields."""
+    if not isinstance(data, bytes) or len(data) < 3 or data[:1] != kind:
+        raise CodecError('Not an encoded {!r} value.'.format(kind))
+    if data[1] != FORMAT_VERSION:
+        raise CodecError('Unknown format version {}.'.format(data[1]))
+    body = data[3:]
+    if data[2] & _FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+    return json.loads(body.decode('utf-8'))
+
+
+def datetime_to_int(dt):
+    """Converts a naive datetime to whole seconds since the epoch."""
+    return int((dt - _EPOCH).total_seconds())
+
+
+def int_to_datetime(seconds):
+    return _EPOCH + datetime.timedelta(seconds=seconds)
@@ -0,0 +1,66 @@
+import re
+
+from django.shortcuts import reverse
+
+
+_BLOG_LINK = re.compile(r'https?://wp\.projectscifi\.org(?!/wp-content)')
+_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_EMPTY_PARAGRAPH = re.compile(r'<p[^>]*>(?:\s|&nbsp;|&#160;|<br\s*/?>)*</p>\s*')
+_IMG = re.compile(r'<img\b([^>]*?)\s*/?>')
+_ATTRIBUTE = re.compile(r'''([^\s=/>]+)(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+))?''')
+_SRC = re.compile(r'''\bsrc\s*=\s*["']?([^"'\s>]+)''')
+# WordPress names resized images e.g. photo-300x200.jpg
+_SIZE_SUFFIX = re.compile(r'-(\d+)x(\d+)\.\w+(?:\?.*)?$')
+
+
+def forward_links(html):
+    """Replaces links to the blog CMS (WordPress) with the corresponding
+    page on this website.
+
+    This is just a simple safeguard against accidental links to the
+    password-protected CMS. All links ought to go to the main website in
+    the source post.
+    """
+    return _BLOG_LINK.sub(reverse('news').rstrip('/'), html)
+
+
+def _process_img(match):
+    attributes = match.group(1)
+    names = {name.lower() for name in _ATTRIBUTE.findall(attributes)}
+    extra = []
+    if 'loading' not in names:
+        extra.append('loading="lazy"')
+    if 'width' not in names and 'height' not in names:
+        # Without dimensions, the page jumps around as images load in
+        src = _SRC.search(attributes)
+        size = _SIZE_SUFFIX.search(src.group(1)) if src else None
+        if size:
+            extra.append('width="{}" height="{}"'.format(*size.groups()))
+    return '<img{}{} />'.format(attributes, ''.join(' ' + attr for attr in extra))
+
+
+def lazy_load_images(html):
+    """Adds `loading="lazy"` to images, and their width and height where
+    WordPress only gave them in the file name of a resized image."""
+    return _IMG.sub(_process_img, html)
+
+
+def strip_markup(html):
+    """Removes markup which doesn't show up on the page, i.e. comments
+    (such as the WordPress editor's block delimiters) and empty
+    paragraphs."""
+    return _EMPTY_PARAGRAPH.sub('', _COMMENT.sub('', html))
+
+
+PIPELINE = (strip_markup, forward_links, lazy_load_images)
+
+
+def process(html):
+    """Prepares rendered HTML from WordPress to be shown on this website.
+
+    This runs once as posts are fetched from the API, so that the cached
+    HTML can be rendered as is.
+    """
+    for step in PIPELINE:
+        html = step(html)
+    return html
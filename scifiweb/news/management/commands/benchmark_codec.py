@@ -0,0 +1,94 @@
+import datetime
+import pickle
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils.safestring import mark_safe
+
+import scifiweb.caching as caching
+import scifiweb.news.blog as blog
+from scifiweb.caching import LocalCache
+
+
+WORDS = (
+    'our volunteers brought lab coats and safety goggles to another '
+    'classroom this week where students ran titrations built circuits '
+    'and asked great questions about careers in science'
+).split()
+
+
+def make_paragraphs(n, rand):
+    """Returns `n` paragraphs of shuffled words, so that content doesn't
+    compress unrealistically well."""
+    paragraphs = []
+    for _ in range(n):
+        words = list(WORDS)
+        rand.shuffle(words)
+        paragraphs.append('<p>{} <a href="https://projectscifi.org/news/">{}</a>.</p>\n'.format(
+            ' '.join(words), rand.choice(WORDS),
+        ))
+    return ''.join(paragraphs)
+
+
+def make_post(id, paragraphs, author, categories, tags):
+    rand = random.Random(id)
+    now = datetime.datetime(2017, 9, 1, 12, 0, 0)
+    return blog.Post(
+        id=id,
+        slug='classroom-visit-{}'.format(id),
+        date=now,
+        modified=now + datetime.timedelta(days=1),
+        title='Classroom visit #{}'.format(id),
+        author=author,
+        content=mark_safe(make_paragraphs(paragraphs, rand)),
+        excerpt=mark_safe(make_paragraphs(1, rand)),
+        categories=categories,
+        tags=tags,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares payload size and encode/decode time of the compact post '
+        'codec against pickling posts whole.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        number = options['number']
+
+        # Decoding looks up authors and terms, so keep them in memory,
+        # and only there so as not to overwrite the real ones
+        caching._local_cache = LocalCache(1000)
+        author = blog.User(1, 'author', 'Author')
+        categories = [blog.Term(1, 'news', 'News', 'category')]
+        tags = [blog.Term(id, 'tag-{}'.format(id), 'Tag {}'.format(id), 'post_tag') for id in range(2, 8)]
+        caching._local_cache.set(blog.USER_BY_ID.key(author.id), author, None)
+        for term in categories + tags:
+            caching._local_cache.set(blog.TERM_BY_ID.key(term.id), term, None)
+
+        self.stdout.write('{:<10} {:>12} {:>12} {:>14} {:>14} {:>14} {:>14}'.format(
+            'content', 'pickle B', 'codec B', 'pickle enc us',
+            'codec enc us', 'pickle dec us', 'codec dec us',
+        ))
+        for paragraphs in (1, 10, 100):
+            post = make_post(1, paragraphs, author, categories, tags)
+            pickled = pickle.dumps(post, pickle.HIGHEST_PROTOCOL)
+            encoded = blog.PostCodec.dumps(post)
+            assert blog.PostCodec.loads(encoded) == post
+
+            def per_call(fn):
+                return timeit.timeit(fn, number=number) / number * 1e6
+
+            self.stdout.write('{:<10} {:>12} {:>12} {:>14.1f} {:>14.1f} {:>14.1f} {:>14.1f}'.format(
+                '{} B'.format(len(post.content)),
+                len(pickled),
+                len(encoded),
+                per_call(lambda: pickle.dumps(post, pickle.HIGHEST_PROTOCOL)),
+                per_call(lambda: blog.PostCodec.dumps(post)),
+                per_call(lambda: pickle.loads(pickled)),
+                per_call(lambda: blog.PostCodec.loads(encoded)),
+            ))
@@ -0,0 +1,151 @@
+import datetime
+import random
+import sys
+import timeit
+import tracemalloc
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand
+from django.shortcuts import reverse
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+
+import scifiweb.caching as caching
+import scifiweb.news.blog as blog
+from scifiweb.caching import LocalCache
+from scifiweb.news.management.commands.benchmark_codec import make_paragraphs
+
+
+class _EagerPost(namedtuple('_EagerPost', blog.Post._fields)):
+    """Posts as they were built before: every field decoded up front,
+    with an instance dict to cache the permalink in."""
+
+    @cached_property
+    def permalink(self):
+        date = self.date.date()
+        return reverse('post', args=(
+            '{:04d}'.format(date.year),
+            '{:02d}'.format(date.month),
+            '{:02d}'.format(date.day),
+            self.slug,
+        ))
+
+    @classmethod
+    def from_api_objects(cls, objs, users, terms):
+        return [cls(
+            id=obj['id'],
+            slug=obj['slug'],
+            date=datetime.datetime.strptime(obj['date'], blog.API_DATETIME_FORMAT),
+            modified=datetime.datetime.strptime(obj['modified'], blog.API_DATETIME_FORMAT),
+            title=obj['title']['rendered'],
+            author=users[obj['author']],
+            content=mark_safe(obj['content']['rendered']),
+            excerpt=mark_safe(obj['excerpt']['rendered']),
+            categories=[terms[id] for id in obj['categories']],
+            tags=[terms[id] for id in obj['tags']],
+        ) for obj in objs]
+
+
+def make_api_object(id, paragraphs):
+    rand = random.Random(id)
+    date = datetime.datetime(2017, 9, 1, 12, 0, 0) + datetime.timedelta(hours=id)
+    return {
+        'id': id,
+        'slug': 'classroom-visit-{}'.format(id),
+        'date': date.strftime(blog.API_DATETIME_FORMAT),
+        'modified': (date + datetime.timedelta(days=1)).strftime(blog.API_DATETIME_FORMAT),
+        'title': {'rendered': 'Classroom visit #{}'.format(id)},
+        'author': 1,
+        'content': {'rendered': make_paragraphs(paragraphs, rand)},
+        'excerpt': {'rendered': make_paragraphs(1, rand)},
+        'categories': [1],
+        'tags': rand.sample(range(2, 8), 3),
+    }
+
+
+def object_size(obj):
+    """Returns the size of an object itself and its instance dict, if
+    any, but not of the field values it shares with other objects."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def allocated(fn):
+    """Returns the number of bytes still allocated by `fn()` when it
+    returns, including its result."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()  # noqa: F841 (kept alive until measured)
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares construction time and memory of pages of posts built '
+        'from WordPress API objects against decoding every field eagerly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        page_size = options['page_size']
+
+        # Building posts looks up authors and terms, so keep them in memory,
+        # and only there so as not to overwrite the real ones
+        caching._local_cache = LocalCache(1000)
+        users = {1: blog.User(1, 'author', 'Author')}
+        terms = {1: blog.Term(1, 'news', 'News', 'category')}
+        terms.update(
+            (id, blog.Term(id, 'tag-{}'.format(id), 'Tag {}'.format(id), 'post_tag'))
+            for id in range(2, 8)
+        )
+        for user in users.values():
+            caching._local_cache.set(blog.USER_BY_ID.key(user.id), user, None)
+        for term in terms.values():
+            caching._local_cache.set(blog.TERM_BY_ID.key(term.id), term, None)
+
+        objs = [make_api_object(id, 10) for id in range(1, page_size + 1)]
+
+        def build():
+            return blog._posts_from_api_objects(blog.Post, objs)
+
+        def build_eager():
+            return _EagerPost.from_api_objects(objs, users, terms)
+
+        def render(posts):
+            # What a list of posts reads when rendered
+            for post in posts:
+                post.permalink, post.excerpt, post.date
+
+        posts = build()
+        eager_posts = build_eager()
+        assert tuple(posts[0]) == tuple(eager_posts[0])
+        render(posts)
+        render(eager_posts)
+
+        def per_call(fn):
+            return timeit.timeit(fn, number=number) / number * 1e6
+
+        self.stdout.write('{} posts per page\n'.format(page_size))
+        self.stdout.write('{:<8} {:>12} {:>14} {:>12} {:>14}'.format(
+            '', 'build us', 'build+read us', 'object B', 'page B',
+        ))
+        for name, fn, sample in (
+            ('eager', build_eager, eager_posts[0]),
+            ('lazy', build, posts[0]),
+        ):
+            self.stdout.write('{:<8} {:>12.1f} {:>14.1f} {:>12} {:>14}'.format(
+                name,
+                per_call(fn),
+                per_call(lambda: render(fn())),
+                object_size(sample),
+                allocated(fn),
+            ))
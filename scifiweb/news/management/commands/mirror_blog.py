@@ -0,0 +1,106 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+import scifiweb.news.blog as blog
+import scifiweb.news.search as search
+import scifiweb.page_cache  # noqa: F401 (drops cached pages as posts change)
+
+
+_logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Keeps the cache populated with every post, user, tag and category '
+        'from WordPress, so that requests almost never have to query it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=300,
+            help=(
+                'Seconds between refreshes. Keep this below the blog cache '
+                'TTL so entries never go stale.'
+            ),
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Refresh once and exit instead of running forever.',
+        )
+
+    def handle(self, *args, **options):
+        self.post_sync = None
+        self.index = None
+        while True:
+            start = time.monotonic()
+            try:
+                counts = self.refresh()
+            except Exception:
+                # Keep running; the next refresh will probably work. It
+                # starts over from the last published index, since this
+                # one may have been left half-synced.
+                _logger.exception('Mirroring the blog failed')
+                self.post_sync = self.index = None
+            else:
+                _logger.info('Mirrored {} in {:.1f}s'.format(
+                    ', '.join('{} {}'.format(n, kind) for kind, n in counts),
+                    time.monotonic() - start,
+                ))
+
+            if options['once']:
+                return
+            self.wait(options['interval'] - (time.monotonic() - start))
+
+    def wait(self, seconds):
+        """Sleeps for up to `seconds`, waking up early when a sync is
+        requested, e.g. by the webhook."""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                if blog.take_sync_request():
+                    return
+            except Exception:
+                _logger.exception('Checking for sync requests failed')
+            time.sleep(max(0, min(1, deadline - time.monotonic())))
+
+    def refresh(self):
+        """Brings the cache up to date with WordPress, writing everything
+        under the keys the blog getters read, and publishes a search
+        index of all posts. Returns counts of what was fetched.
+
+        Posts are synced incrementally, picking up from the published
+        search index if there is one.
+        """
+        if self.post_sync is None:
+            self.index = search.load_published_index()
+            if self.index is None:
+                self.post_sync = blog.PostSync()
+            else:
+                self.post_sync = blog.PostSync(self.index.documents.values())
+
+        counts = []
+        # Authors and terms first, so that building posts finds them cached
+        for kind, getter in (
+            ('users', blog.get_users),
+            ('categories', blog.get_categories),
+            ('tags', blog.get_tags),
+        ):
+            n = 0
+            for page in blog.iter_pages(getter, prefetch=True):
+                n += len(page)
+            counts.append((kind, n))
+
+        changed, deleted = self.post_sync.sync()
+        counts.append(('changed posts', len(changed)))
+        counts.append(('deleted posts', len(deleted)))
+
+        if self.index is None:
+            self.index = search.SearchIndex.from_posts(changed)
+        else:
+            self.index.update(changed, deleted)
+        search.publish_index(self.index)
+        # Only now that the index has the changes too
+        self.post_sync.notify()
+        return counts
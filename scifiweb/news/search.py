@@ -0,0 +1,378 @@
+import bisect
+import datetime
+import html
+import logging
+import math
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import namedtuple
+
+from django.dispatch import receiver
+
+from scifiweb.caching import cache_lookup
+from scifiweb.caching import cache_set
+from scifiweb.caching import KeyFamily
+from scifiweb.news.blog import API_DATETIME_FORMAT
+from scifiweb.news.signals import post_changed
+from scifiweb.page_cache import BLOG_PAGES
+
+
+_logger = logging.getLogger(__name__)
+
+
+# Each process keeps its own copy of the index, and checks the version
+# in the shared cache for a newer one
+SEARCH_INDEX = KeyFamily('news_search_index', 2, local=False)
+# Pages of search results from WordPress, for when there's no index
+SEARCH_RESULTS = KeyFamily('news_search_results', 1)
+
+# An index which stops being republished (e.g. the mirror worker died)
+# is dropped, and searches go back to querying WordPress
+_INDEX_TTL = 60 * 60
+# How often each process checks for a newer index
+_INDEX_CHECK_INTERVAL = 30
+
+# Search results are dropped whenever the blog changes anyway
+RESULTS_TTL = 10 * 60
+RESULTS_STALE_TTL = 60 * 60
+
+# Values WordPress assumes for parameters which are left out
+_DEFAULT_PARAMS = {'order': 'desc', 'orderby': 'date', 'search': ''}
+
+# Relative weight of a word's occurrences in each field of a post
+_FIELD_WEIGHTS = (('title', 3), ('excerpt', 1), ('content', 1))
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+_TAG = re.compile(r'<[^>]*>')
+_WORD = re.compile(r'\w+')
+
+
+class InvalidSearch(ValueError):
+    """Raised for search parameters WordPress would reject with a 400."""
+
+
+def tokenize(text):
+    """Splits HTML or plain text into lowercase words."""
+    return _WORD.findall(html.unescape(_TAG.sub(' ', text)).lower())
+
+
+_Document = namedtuple('_Document', (
+    'id',
+    'slug',
+    'title',
+    'date',
+    'modified',
+    'author',
+    'categories',
+    'tags',
+    'length',
+))
+
+
+class SearchIndex:
+    """An in-memory inverted index over blog posts, answering the same
+    queries as the WordPress list-posts endpoint.
+
+    Searches match posts containing every search word (or a word
+    starting with it) in their title, excerpt or content, ranked by
+    BM25 when ordering by relevance.
+
+    Posts can also be found by slug, which lets permalinks be resolved
+    without any cache lookups.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.slugs = {}
+        # word -> {post id: weighted term frequency}
+        self.postings = {}
+        self.vocabulary = []
+        self.average_length = 0
+        # Changes whenever the contents do
+        self.version = None
+
+    @classmethod
+    def from_posts(cls, posts):
+        index = cls()
+        for post in posts:
+            index._add(post)
+        index._finish()
+        return index
+
+    def update(self, changed, deleted):
+        """Replaces the given changed posts and removes deleted ones, by
+        id. Returns whether anything changed."""
+        removed = {post.id for post in changed} | set(deleted)
+        if not changed and not removed & set(self.documents):
+            return False
+        for word in list(self.postings):
+            postings = self.postings[word]
+            for id in removed:
+                postings.pop(id, None)
+            if not postings:
+                del self.postings[word]
+        for id in removed:
+            doc = self.documents.pop(id, None)
+            if doc is not None and self.slugs.get(doc.slug) == id:
+                del self.slugs[doc.slug]
+        for post in changed:
+            self._add(post)
+        self._finish()
+        return True
+
+    def _add(self, post):
+        frequencies = {}
+        length = 0
+        for field, weight in _FIELD_WEIGHTS:
+            for word in tokenize(str(getattr(post, field))):
+                frequencies[word] = frequencies.get(word, 0) + weight
+                length += weight
+        for word, frequency in frequencies.items():
+            self.postings.setdefault(word, {})[post.id] = frequency
+
+        self.slugs[post.slug] = post.id
+        self.documents[post.id] = _Document(
+            id=post.id,
+            slug=post.slug,
+            title=html.unescape(_TAG.sub('', post.title)).lower(),
+            date=post.date,
+            modified=post.modified,
+            author=post.author.id if post.author else None,
+            categories=frozenset(term.id for term in post.categories if term),
+            tags=frozenset(term.id for term in post.tags if term),
+            length=length,
+        )
+
+    def _finish(self):
+        self.vocabulary = sorted(self.postings)
+        self.average_length = (
+            sum(doc.length for doc in self.documents.values()) / len(self.documents)
+            if self.documents else 0
+        )
+        self.version = uuid.uuid4().hex
+
+    def __len__(self):
+        return len(self.documents)
+
+    def find_slug(self, slug):
+        """Returns the id, slug, dates, etc. of the post with a slug, or
+        None if it isn't in the index.
+
+        Slugs with non-ASCII characters may be given as they are in URLs
+        unquoted by Django; WordPress stores them percent-encoded.
+        """
+        id = self.slugs.get(slug)
+        if id is None:
+            id = self.slugs.get(urllib.parse.quote(slug, safe='').lower())
+        return self.documents[id] if id is not None else None
+
+    def _expand(self, word):
+        """Returns all indexed words starting with `word`."""
+        start = bisect.bisect_left(self.vocabulary, word)
+        words = []
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(word):
+                break
+            words.append(candidate)
+        return words
+
+    def _match(self, query):
+        """Returns a dict from id to BM25 score for posts matching every
+        word of the query."""
+        scores = None
+        n = len(self.documents)
+        for word in set(tokenize(query)):
+            word_scores = {}
+            for match in self._expand(word):
+                postings = self.postings[match]
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id, frequency in postings.items():
+                    norm = _K1 * (1 - _B + _B * self.documents[id].length / self.average_length)
+                    word_scores[id] = word_scores.get(id, 0) + (
+                        idf * frequency * (_K1 + 1) / (frequency + norm)
+                    )
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    id: score + word_scores[id]
+                    for id, score in scores.items() if id in word_scores
+                }
+        return scores
+
+    def search(self, params, page=1, per_page=10):
+        """Runs a query with the parameters of the WordPress list-posts
+        endpoint: `search`, `author[]`, `tags[]`, `categories[]`,
+        `after`, `before`, `order` and `orderby`.
+
+        Returns a triple `(ids, total, total_pages)` of the post ids on
+        the requested page and the totals WordPress would send in its
+        `X-WP-Total` and `X-WP-TotalPages` headers. Raises
+        `InvalidSearch` where WordPress would respond with a 400.
+        """
+        def ids(param):
+            try:
+                return {int(id) for id in params.get(param, ())}
+            except ValueError:
+                raise InvalidSearch('Invalid {}'.format(param))
+
+        def date(param):
+            try:
+                return datetime.datetime.strptime(params[param], API_DATETIME_FORMAT) \
+                    if param in params else None
+            except ValueError:
+                raise InvalidSearch('Invalid {}'.format(param))
+
+        authors = ids('author[]')
+        tags = ids('tags[]')
+        categories = ids('categories[]')
+        after = date('after')
+        before = date('before')
+        order = params.get('order', 'desc')
+        orderby = params.get('orderby', 'date')
+        if order not in ('asc', 'desc'):
+            raise InvalidSearch('Invalid order')
+
+        query = params.get('search')
+        scores = self._match(query) if query else None
+        if orderby == 'relevance' and scores is None:
+            raise InvalidSearch('Ordering by relevance requires a search')
+
+        matches = [
+            doc for doc in (
+                self.documents.values() if scores is None
+                else (self.documents[id] for id in scores)
+            )
+            if (not authors or doc.author in authors)
+            and (not tags or doc.tags & tags)
+            and (not categories or doc.categories & categories)
+            and (after is None or doc.date > after)
+            and (before is None or doc.date < before)
+        ]
+
+        sort_keys = {
+            'date': lambda doc: (doc.date, doc.id),
+            'modified': lambda doc: (doc.modified, doc.id),
+            'id': lambda doc: doc.id,
+            'title': lambda doc: (doc.title, doc.id),
+            'slug': lambda doc: doc.slug,
+            'relevance': lambda doc: (scores[doc.id], doc.date),
+        }
+        try:
+            sort_key = sort_keys[orderby]
+        except KeyError:
+            raise InvalidSearch('Invalid orderby')
+        matches.sort(key=sort_key, reverse=order == 'desc')
+
+        total = len(matches)
+        total_pages = math.ceil(total / per_page)
+        if page > 1 and page > total_pages:
+            raise InvalidSearch('Page number larger than number of pages')
+        start = (page - 1) * per_page
+        return [doc.id for doc in matches[start:start + per_page]], total, total_pages
+
+
+def canonical_params(search_params, page_params):
+    """Merges search and page parameters into the simplest equivalent
+    query, so that searches which only differ in the order of filters,
+    duplicated filters or explicit defaults are the same query.
+    """
+    params = {}
+    for param, value in search_params.items():
+        if isinstance(value, (list, tuple)):
+            if value:
+                params[param] = sorted(set(value))
+        elif _DEFAULT_PARAMS.get(param) != value:
+            params[param] = value
+    params.update(page_params)
+    return params
+
+
+def results_key(params):
+    """Returns the key for a page of results of a canonical query."""
+    return SEARCH_RESULTS.key(tuple(sorted(
+        (param, tuple(value) if isinstance(value, list) else value)
+        for param, value in params.items()
+    )))
+
+
+@receiver(post_changed, dispatch_uid='scifiweb.news.search')
+def _drop_results(sender, **kwargs):
+    SEARCH_RESULTS.bump()
+
+
+def publish_index(index):
+    """Makes an index available to all processes through the cache.
+
+    Processes only reload the index when its version changed, so an
+    unchanged index can be republished to keep it from expiring.
+    """
+    cache_set(SEARCH_INDEX.key('index'), index, _INDEX_TTL)
+    cache_set(SEARCH_INDEX.key('version'), index.version, _INDEX_TTL)
+
+
+def load_published_index():
+    """Returns a copy of the latest published index straight from the
+    cache, or `None` if there is none.
+
+    Unlike `get_index`, the result isn't shared with anything else in the
+    process, so it can be updated and published again.
+    """
+    try:
+        return cache_lookup(SEARCH_INDEX.key('index'))
+    except KeyError:
+        return None
+
+
+_index = None
+_index_version = None
+_index_checked = None
+_index_generation = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the latest published search index, or `None` if there is
+    none (e.g. the mirror worker isn't running).
+
+    Each process keeps its own copy and only checks for a newer one
+    every `_INDEX_CHECK_INTERVAL` seconds, or as soon as it sees blog
+    pages being invalidated. The mirror worker publishes the index
+    before invalidating them, so pages rendered afresh use the index
+    which has the change.
+    """
+    global _index, _index_version, _index_checked, _index_generation
+    generation = BLOG_PAGES.generation()
+    with _index_lock:
+        now = time.monotonic()
+        if (
+            _index_checked is not None
+            and now - _index_checked < _INDEX_CHECK_INTERVAL
+            and generation == _index_generation
+        ):
+            return _index
+        _index_checked = now
+        _index_generation = generation
+
+        try:
+            version = cache_lookup(SEARCH_INDEX.key('version'))
+        except KeyError:
+            _index = _index_version = None
+            return None
+
+        if version != _index_version:
+            try:
+                _index = cache_lookup(SEARCH_INDEX.key('index'))
+            except KeyError:
+                _index = None
+            _index_version = version
+            _logger.debug('Loaded search index {} ({} posts)'.format(
+                version, len(_index) if _index is not None else 0,
+            ))
+        return _index
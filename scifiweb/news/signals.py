@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# Sent whenever a post was published, edited or deleted, with its
+# `post_id` and the `slugs` it had before and after the change. When a
+# user or term changed, which may change how any post is shown, it's
+# sent with a `post_id` of None.
+post_changed = Signal(providing_args=['post_id', 'slugs'])
@@ -1,4 +1,5 @@
 import datetime
+import re
 import urllib.parse
 
 import requests
@@ -10,7 +11,11 @@ from django.shortcuts import reverse
 from django.template.loader import render_to_string
 
 import scifiweb.news.blog as blog
+import scifiweb.news.search as search
+from scifiweb.caching import cache_lookup_with_fallback
 from scifiweb.home import MEMBERS_MAP
+from scifiweb.page_cache import BLOG_PAGES
+from scifiweb.page_cache import cache_response
 from scifiweb.templatetags.post import format_post_date
 
 
@@ -51,31 +56,70 @@ def redirect_post_by_id(request, id):
         raise _post_404(id)
 
 
+# What WordPress slugs look like (once Django has unquoted them)
+_SLUG = re.compile(r'^[\w%-]+$')
+
+
+def get_post_by_slug(slug, date_matches=None, known_only=False):
+    """Retrieves a post given its slug, or None if there's no such post
+    or if `date_matches(date)` is false for its publication date.
+
+    Slugs in the published search index are resolved to an id, or
+    rejected by date, without any cache lookups before the post itself
+    is loaded. Other slugs are looked up as usual, unless `known_only`
+    is true, in which case they are rejected as well. Anything which
+    couldn't be a slug is always rejected straight away.
+    """
+    if not _SLUG.match(slug):
+        return None
+
+    index = search.get_index()
+    doc = index.find_slug(slug) if index is not None else None
+    if doc is not None:
+        if date_matches and not date_matches(doc.date.date()):
+            return None
+        post = blog.get_post_by_id(doc.id)
+    elif index is not None and known_only:
+        return None
+    else:
+        post = blog.get_post_by_slug(slug)
+
+    if post and date_matches and not date_matches(post.date.date()):
+        return None
+    return post
+
+
 def redirect_post_by_slug(request, slug):
-    post = blog.get_post_by_slug(slug)
+    # This catches every other path under /news/, most of which aren't
+    # posts at all, so only posts which were around when the index was
+    # last refreshed are looked up
+    post = get_post_by_slug(slug, known_only=True)
     if post:
         return redirect(post.permalink)
     else:
         raise _post_404(slug)
 
 
+@cache_response(family=BLOG_PAGES)
 def render_post_by_ymds(request, year, month, day, slug):
-    post = blog.get_post_by_slug(slug)
-    if post:
+    try:
         date = datetime.date(int(year), int(month), int(day))
-        post_date = post.date.date()
-        if date == post_date:
-            return render_post(request, post)
+    except ValueError:
+        raise _post_404(slug)
+    post = get_post_by_slug(slug, lambda post_date: post_date == date)
+    if post:
+        return render_post(request, post)
     raise _post_404(slug)
 
 
 def redirect_post_by_yms(request, year, month, slug):
-    post = blog.get_post_by_slug(slug)
-    if post:
+    try:
         date = datetime.date(int(year), int(month), 1)
-        post_date = post.date.date()
-        if date == post_date.replace(day=1):
-            return redirect(post.permalink)
+    except ValueError:
+        raise _post_404(slug)
+    post = get_post_by_slug(slug, lambda post_date: post_date.replace(day=1) == date)
+    if post:
+        return redirect(post.permalink)
     raise _post_404(slug)
 
 
@@ -129,28 +173,57 @@ def validate_search_params(search_params):
         search_params['orderby'] = 'date'
 
 
-def render_search_titles(search_params, page_params):
+# As many ids as WordPress lets us look up in one query
+_MAX_SEARCH_IDS = 100
+
+
+def _search_ids(search_params, param):
+    """Returns the valid ids given for a search filter, in order and
+    without duplicates, up to as many as fit in one API query."""
+    ids = []
+    for id in search_params.get(param, ()):
+        try:
+            id = int(id)
+        except ValueError:
+            continue
+        if id not in ids:
+            ids.append(id)
+    return ids[:_MAX_SEARCH_IDS]
+
+
+def load_search_names(loader, search_params):
+    """Starts looking up the authors, tags and categories a search is
+    filtered on, all at once, returning a future of a pair `(users,
+    terms)` of dicts by id."""
+    return loader.load(
+        blog.resolve_references,
+        frozenset(_search_ids(search_params, 'author[]')),
+        frozenset(_search_ids(search_params, 'categories[]')),
+        frozenset(_search_ids(search_params, 'tags[]')),
+    )
+
+
+def render_search_titles(search_params, page_params, loader=None):
     """Returns a triple of `(title, hero_title, subtitle)` appropriate
     for some search parameters and pagination.
+
+    Names are looked up with `loader`, which may already be loading them.
     """
     search = search_params.get('search')
 
+    users, terms = load_search_names(loader or blog.Loader(), search_params).result()
+
+    def term_names(param, taxonomy):
+        return [
+            terms[id].name for id in _search_ids(search_params, param)
+            if terms.get(id) and terms[id].taxonomy == taxonomy
+        ]
+
     author_names = [
-        user.name for user in [
-            blog.get_user_by_id(id) for id in search_params.get('author[]', [])
-        ] if user
-    ]
-    tag_names = [
-        tag.name for tag in [
-            blog.get_tag_by_id(id) for id in search_params.get('tags[]', [])
-        ] if tag
-    ]
-    category_names = [
-        category.name for category in [
-            blog.get_category_by_id(id)
-            for id in search_params.get('categories[]', [])
-        ] if category
+        users[id].name for id in _search_ids(search_params, 'author[]') if users.get(id)
     ]
+    tag_names = term_names('tags[]', 'post_tag')
+    category_names = term_names('categories[]', 'category')
 
     try:
         before_date = datetime.datetime.strptime(
@@ -211,6 +284,51 @@ def render_search_titles(search_params, page_params):
     return title, hero_title, subtitle
 
 
+def search_posts(search_params, page_params):
+    """Returns a triple of `(posts, total_posts, total_pages)` for some
+    search parameters and pagination, where the posts are summaries.
+
+    Searches are answered from the local search index when one has been
+    published, and by WordPress otherwise. WordPress's results are cached
+    as post ids, by their canonical query.
+    """
+    index = search.get_index()
+    if index is not None:
+        try:
+            ids, total_posts, total_pages = index.search(
+                search_params, **page_params
+            )
+        except search.InvalidSearch:
+            return [], 0, 1
+        posts = [post for post in blog.get_post_summaries_by_ids(ids) if post]
+        return posts, total_posts, total_pages
+
+    params = search.canonical_params(search_params, page_params)
+
+    def query():
+        try:
+            posts, headers = blog.get_post_summaries(params, headers=True)
+        except requests.HTTPError as e:
+            # If the request is bad, show zero results (in lieu of validation)
+            if e.response.status_code == 400:
+                posts, headers = [], {}
+            else:
+                raise
+        return (
+            [post.id for post in posts],
+            int(headers.get('X-WP-Total', 0)),
+            int(headers.get('X-WP-TotalPages', 1)),
+        )
+
+    ids, total_posts, total_pages = cache_lookup_with_fallback(
+        search.results_key(params), query, search.RESULTS_TTL, search.RESULTS_STALE_TTL,
+    )
+    # The summaries were cached as they were fetched
+    posts = [post for post in blog.get_post_summaries_by_ids(ids) if post]
+    return posts, total_posts, total_pages
+
+
+@cache_response(family=BLOG_PAGES)
 def render_search(request):
     # First, if 'p' is set, redirect to the appropriate post
     post_id = request.GET.get('p')
@@ -271,28 +389,15 @@ def render_search(request):
     # Validation
     validate_search_params(search_params)
 
-    try:
-        params = dict(search_params)
-        params.update(page_params)
-        posts, headers = blog.get_posts(params, headers=True)
-    except requests.HTTPError as e:
-        # If the request is bad, show zero results (in lieu of validation)
-        if e.response.status_code == 400:
-            posts, headers = [], {}
-        else:
-            raise
+    # Start looking up the names in the fancy templated title, then
+    # search while they load, since either may have to wait on WordPress
+    loader = blog.Loader()
+    load_search_names(loader, search_params)
+    posts, total_posts, total_pages = search_posts(search_params, page_params)
+    title, hero_title, subtitle = render_search_titles(search_params, page_params, loader)
 
     # Finally, set up vars for page rendering
 
-    # Fancy templated title
-    title, hero_title, subtitle = render_search_titles(
-        search_params, page_params
-    )
-
-    # Pagination handling
-    total_posts = int(headers.get('X-WP-Total', 0))
-    total_pages = int(headers.get('X-WP-TotalPages', 1))
-
     return render(
         request,
         'news/search.html',
@@ -0,0 +1,45 @@
+import hmac
+import json
+
+from django.conf import settings
+from django.http import Http404
+from django.http import HttpResponseBadRequest
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+import scifiweb.news.blog as blog
+
+
+_REFRESHERS = {
+    'post': blog.refresh_post,
+    'user': blog.refresh_user,
+    'term': blog.refresh_term,
+}
+
+
+@csrf_exempt
+@require_POST
+def blog_webhook_view(request):
+    """Endpoint for WordPress to call whenever a post, user or term is
+    created, edited or deleted, with a JSON body such as
+    `{"type": "post", "id": 123}`.
+
+    The cached copies of the object are replaced with its current
+    version straight away, so cached content can have long TTLs.
+    Requires the configured token as a bearer token.
+    """
+    token = settings.BLOG_WEBHOOK_TOKEN
+    provided = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(provided, 'Bearer ' + token):
+        raise Http404()
+
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+        refresh = _REFRESHERS[payload['type']]
+        id = int(payload['id'])
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest('Expected {"type": "post|user|term", "id": ...}')
+
+    obj = refresh(id)
+    return JsonResponse({'type': payload['type'], 'id': id, 'exists': obj is not None})
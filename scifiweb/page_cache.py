@@ -0,0 +1,95 @@
+import functools
+import urllib.parse
+from collections import namedtuple
+
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from scifiweb.caching import cache_lookup_with_fallback
+from scifiweb.caching import KeyFamily
+from scifiweb.news.signals import post_changed
+
+
+# Pages which don't depend on the blog
+PAGES = KeyFamily('page', 1)
+# Pages which show posts, users or terms, all of which are invalidated
+# whenever any of them changes
+BLOG_PAGES = KeyFamily('blog_page', 1)
+
+# Only responses with these headers are cached; anything else (e.g.
+# Set-Cookie or Vary) would make a cached page wrong for someone
+_CACHED_HEADERS = frozenset(('content-type', 'content-language'))
+
+
+class _CachedPage(namedtuple('_CachedPage', ('status', 'content', 'headers'))):
+    """A rendered response, as stored in the cache."""
+    __slots__ = ()
+
+    @classmethod
+    def from_response(cls, request, response):
+        """Returns the cacheable form of a response, or None if it
+        shouldn't be shared with anyone else."""
+        if (
+            response.status_code != 200
+            or response.streaming
+            or response.cookies
+            # The page has a CSRF token in it
+            or request.META.get('CSRF_COOKIE_USED')
+            or any(header.lower() not in _CACHED_HEADERS for header, _ in response.items())
+        ):
+            return None
+        return cls(response.status_code, response.content, tuple(response.items()))
+
+    def to_response(self):
+        response = HttpResponse(self.content, status=self.status)
+        for header, value in self.headers:
+            response[header] = value
+        return response
+
+
+def _page_key(family, request):
+    """Returns the key for a page, with the query string in a canonical
+    order."""
+    query = sorted(urllib.parse.parse_qsl(request.META.get('QUERY_STRING', ''), keep_blank_values=True))
+    return family.key(request.path, urllib.parse.urlencode(query))
+
+
+def cache_response(ttl=5 * 60, stale_ttl=60 * 60, family=PAGES):
+    """View decorator which caches rendered pages in both cache tiers,
+    keyed on the path and query string.
+
+    Only GET and HEAD requests are served from the cache, and only plain
+    200 responses which set no cookies are stored. Other responses are
+    remembered as uncacheable for `ttl`, so their views are called as
+    usual without being re-checked on every request.
+
+    With a `stale_ttl`, pages older than `ttl` are still served while
+    the view renders them again in the background. Pages in the
+    `BLOG_PAGES` family are dropped whenever the blog changes.
+    """
+    def outer(view):
+        @functools.wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            rendered = []
+
+            def render():
+                response = view(request, *args, **kwargs)
+                rendered.append(response)
+                return _CachedPage.from_response(request, response)
+
+            page = cache_lookup_with_fallback(_page_key(family, request), render, ttl, stale_ttl)
+            if rendered:
+                return rendered[0]
+            if page is None:
+                return view(request, *args, **kwargs)
+            return page.to_response()
+        return inner
+    return outer
+
+
+@receiver(post_changed, dispatch_uid='scifiweb.page_cache')
+def _drop_blog_pages(sender, **kwargs):
+    BLOG_PAGES.bump()
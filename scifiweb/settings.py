@@ -1,9 +1,7 @@
 import configparser
 import os
 import socket
-import warnings
 
-from django.core.cache import CacheKeyWarning
 from django.template.base import TemplateSyntaxError
 
 
@@ -21,7 +19,22 @@ DEFAULT_CONFIG = {
     'email': {
         'contact_address': None,
         'unauthenticated_host': None,
-    }
+    },
+    'cache': {
+        'local_max_entries': 1000,
+        'local_default_ttl': 60,
+        'local_max_ttl': 60,
+        'refresh_threads': 4,
+        'stats_token': None,
+    },
+    'blog': {
+        'api_url': 'https://wp.projectscifi.org/wp-json/wp/v2/',
+        'connect_timeout': 1,
+        'read_timeout': 1,
+        'pool_connections': 2,
+        'pool_maxsize': 8,
+        'webhook_token': None,
+    },
 }
 
 config = configparser.RawConfigParser()
@@ -152,8 +165,28 @@ CACHES = {
     }
 }
 
-# We don't use memcached, so these warnings are not helpful
-warnings.simplefilter('ignore', CacheKeyWarning)
+# Per-process LRU in front of Redis; disabled along with the shared cache
+LOCAL_CACHE_MAX_ENTRIES = config.getint('cache', 'local_max_entries') \
+    if not DEBUG or DEBUG_USE_CACHE else 0
+LOCAL_CACHE_DEFAULT_TTL = config.getint('cache', 'local_default_ttl')
+# Bounds how long other processes keep serving an entry after it changed
+LOCAL_CACHE_MAX_TTL = config.getint('cache', 'local_max_ttl')
+# Threads per process for refreshing stale cache entries in the background
+CACHE_REFRESH_THREADS = config.getint('cache', 'refresh_threads')
+# Bearer token for the internal cache stats endpoint outside debug mode
+CACHE_STATS_TOKEN = config.get('cache', 'stats_token')
+
+
+# WordPress API client; each process keeps a pool of persistent connections
+BLOG_API_URL = config.get('blog', 'api_url')
+BLOG_API_TIMEOUT = (
+    config.getfloat('blog', 'connect_timeout'),
+    config.getfloat('blog', 'read_timeout'),
+)
+BLOG_API_POOL_CONNECTIONS = config.getint('blog', 'pool_connections')
+BLOG_API_POOL_MAXSIZE = config.getint('blog', 'pool_maxsize')
+# Bearer token WordPress sends to the webhook when content changes
+BLOG_WEBHOOK_TOKEN = config.get('blog', 'webhook_token')
 
 
 LANGUAGE_CODE = 'en-us'
@@ -1,10 +1,8 @@
-import re
 import urllib.parse
 from collections import namedtuple
 
 from django import template
 from django.shortcuts import reverse
-from django.utils.safestring import mark_safe
 
 from scifiweb.utils import Link
 
@@ -22,22 +20,6 @@ def format_post_time(time):
     return time.strftime('%-I:%M %p')
 
 
-@register.filter
-def forward_blog_links(text):
-    """A dumb find-and-replace filter which replaces links to the blog
-    CMS (WordPress) to the corresponding page on this website.
-
-    This is just a simple safeguard against accidental links to the
-    password-protected CMS. All links ought to go to the main website in
-    the source post.
-    """
-    return mark_safe(re.sub(
-        r'https?://wp\.projectscifi\.org(?!/wp-content)',
-        reverse('news').rstrip('/'),
-        text,
-    ))
-
-
 @register.inclusion_tag('news/partials/tag.html')
 def post_tag(tag):
     return {'tag': tag}
@@ -5,12 +5,16 @@ from django.shortcuts import reverse
 
 import scifiweb.about.urls
 import scifiweb.news.urls
+from scifiweb.cache_stats import cache_stats_view
 from scifiweb.home import home
+from scifiweb.news.webhook import blog_webhook_view
 from scifiweb.robots import robots_dot_txt
 
 urlpatterns = [
     url(r'^$', home, name='home'),
     url(r'^robots\.txt$', robots_dot_txt, name='robots.txt'),
+    url(r'^internal/cache-stats$', cache_stats_view),
+    url(r'^internal/blog-webhook$', blog_webhook_view),
 
     url(r'^about/', include(scifiweb.about.urls.urlpatterns)),
     url(r'^news/', include(scifiweb.news.urls.urlpatterns)),
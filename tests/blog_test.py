@@ -0,0 +1,391 @@
+import datetime
+import functools
+import os
+import threading
+
+import mock
+import pytest
+import requests
+from django.core.cache import cache as django_cache
+from django.utils.safestring import SafeText
+
+import scifiweb.cache_stats as cache_stats
+import scifiweb.news.blog as blog
+from scifiweb.caching import cache_lookup
+from scifiweb.caching import cache_lookup_many
+from scifiweb.caching import cache_set
+from scifiweb.caching import local_cache
+from scifiweb.news.signals import post_changed
+
+
+def make_post(id, author=1, categories=(1,), tags=()):
+    return {
+        'id': id,
+        'slug': 'post-{}'.format(id),
+        'date': '2017-09-01T12:00:00',
+        'modified': '2017-09-02T12:00:00',
+        'title': {'rendered': 'Post {}'.format(id)},
+        'author': author,
+        'content': {'rendered': '<p>Content</p>'},
+        'excerpt': {'rendered': '<p>Excerpt</p>'},
+        'categories': list(categories),
+        'tags': list(tags),
+    }
+
+
+@pytest.fixture
+def cached_objects(locmem_cache):
+    cache_set(blog.USER_BY_ID.key(1), blog.User(1, 'author', 'Author'), 60)
+    cache_set(blog.TERM_BY_ID.key(1), blog.Term(1, 'news', 'News', 'category'), 60)
+    cache_set(blog.TERM_BY_ID.key(2), blog.Term(2, 'lab', 'Lab', 'post_tag'), 60)
+
+
+def test_from_api_objects_resolves_references_in_one_lookup(cached_objects):
+    with mock.patch.object(
+        blog, 'cache_lookup_many', wraps=blog.cache_lookup_many,
+    ) as lookup_many, mock.patch.object(blog, 'query_endpoint') as query:
+        posts = blog.Post.from_api_objects([
+            make_post(1), make_post(2, tags=(2,)), make_post(3, tags=(2,)),
+        ])
+
+    assert not query.called
+    assert lookup_many.call_count == 1
+    assert [post.author.slug for post in posts] == ['author'] * 3
+    assert [[tag.slug for tag in post.tags] for post in posts] == [[], ['lab'], ['lab']]
+    assert cache_lookup(blog.POST_BY_ID.key(2)) == posts[1]
+    assert cache_lookup(blog.POST_ID_BY_SLUG.key('post-3')) == 3
+
+
+def test_posts_round_trip_through_the_shared_cache(cached_objects):
+    long_content = '<p>{}</p>'.format('Lab coats! ' * 500)
+    obj = make_post(1, categories=(1,), tags=(2,))
+    obj['content']['rendered'] = long_content
+    post = blog.Post.from_api_object(obj)
+
+    stored = django_cache.get(blog.POST_BY_ID.key(1))
+    assert isinstance(stored.value, bytes)
+    assert len(stored.value) < len(long_content)
+
+    local_cache().clear()
+    assert cache_lookup(blog.POST_BY_ID.key(1)) == post
+
+
+def test_posts_are_compact_and_mark_html_safe_when_read(cached_objects):
+    post, = blog.Post.from_api_objects([make_post(1)])
+    assert not hasattr(post, '__dict__')
+    assert post.date == datetime.datetime(2017, 9, 1, 12)
+    assert isinstance(post.content, SafeText)
+    assert isinstance(post.summary().excerpt, SafeText)
+    assert post.permalink == '/news/2017/09/01/post-1/'
+
+
+def test_posts_with_evicted_references_are_misses_without_queries(cached_objects):
+    blog.Post.from_api_objects([make_post(1), make_post(2, tags=(2,))])
+    django_cache.delete(blog.TERM_BY_ID.key(2))
+    local_cache().clear()
+
+    with mock.patch.object(blog, 'query_endpoint') as query:
+        hits = cache_lookup_many([blog.POST_BY_ID.key(1), blog.POST_BY_ID.key(2)])
+        assert [post.id for post in hits.values()] == [1]
+        with pytest.raises(KeyError):
+            cache_lookup(blog.POST_BY_ID.key(2))
+    assert not query.called
+
+
+def test_iter_pages_follows_total_pages():
+    calls = []
+
+    def getter(params, headers=False):
+        calls.append(params)
+        page = params['page']
+        return [page * 10, page * 10 + 1], {'X-WP-TotalPages': '3'}
+
+    pages = list(blog.iter_pages(getter, {'search': 'lab'}, per_page=2))
+    assert pages == [[10, 11], [20, 21], [30, 31]]
+    assert calls[-1] == {'search': 'lab', 'page': 3, 'per_page': 2}
+
+
+def test_post_sync_only_fetches_changes(cached_objects):
+    wordpress = {1: make_post(1), 2: make_post(2), 3: make_post(3)}
+    requests = []
+
+    def query_endpoint(endpoint, params, headers=False, **kwargs):
+        requests.append(params)
+        objs = sorted(wordpress.values(), key=lambda obj: obj['modified'])
+        if 'modified_after' in params:
+            objs = [obj for obj in objs if obj['modified'] > params['modified_after']]
+        if 'include[]' in params:
+            objs = [obj for obj in objs if obj['id'] in params['include[]']]
+        total = len(objs)
+        objs = objs[:params['per_page']]
+        if params.get('_fields') == 'id':
+            objs = [{'id': obj['id']} for obj in objs]
+        result = kwargs['list_constructor'](objs)
+        return (result, {'X-WP-Total': str(total), 'X-WP-TotalPages': '1'}) if headers else result
+
+    sync = blog.PostSync()
+    with mock.patch.object(blog, 'query_endpoint', query_endpoint):
+        changed, deleted = sync.sync()
+        assert [post.id for post in changed] == [1, 2, 3]
+
+        del wordpress[1]
+        wordpress[2]['modified'] = '2017-09-03T12:00:00'
+        wordpress[2]['slug'] = 'renamed'
+        changed, deleted = sync.sync()
+        assert [post.slug for post in changed] == ['renamed']
+        assert deleted == {1}
+        assert cache_lookup(blog.POST_ID_BY_SLUG.key('renamed')) == 2
+        for key in (blog.POST_BY_ID.key(1), blog.POST_ID_BY_SLUG.key('post-2')):
+            with pytest.raises(KeyError):
+                cache_lookup(key)
+
+        del requests[:]
+        with mock.patch.object(blog, 'cache_set_many', wraps=blog.cache_set_many) as set_many:
+            assert sync.sync() == ([], set())
+            assert len(requests) == 2
+            # Unchanged posts are only rewritten once they're getting old
+            written = {key for call in set_many.call_args_list for key in call[0][0]}
+            assert blog.POST_BY_ID.key(3) not in written
+            sync.written[3] -= blog._RENEW_AGE
+            sync.sync()
+            assert blog.POST_BY_ID.key(3) in set_many.call_args[0][0]
+
+        # Changes are only announced once the caller is ready
+        sync.notify()
+        changes = []
+
+        def receiver(sender, **kwargs):
+            changes.append(kwargs['post_id'])
+
+        post_changed.connect(receiver)
+        try:
+            wordpress[3]['modified'] = '2017-09-04T12:00:00'
+            sync.sync()
+            assert changes == []
+            sync.notify()
+        finally:
+            post_changed.disconnect(receiver)
+        assert changes == [3]
+
+        # A scheduled post is published without being modified
+        wordpress[4] = make_post(4)
+        changed, deleted = sync.sync()
+        assert [post.id for post in changed] == [4]
+        assert sync.slugs[4] == 'post-4'
+        del requests[:]
+        assert sync.sync() == ([], set())
+        assert len(requests) == 2
+
+
+def test_from_api_objects_fetches_missing_references_in_bulk(locmem_cache):
+    objects = {
+        'users': [{'id': 1, 'slug': 'author', 'name': 'Author'}],
+        'categories': [{'id': 1, 'slug': 'news', 'name': 'News', 'taxonomy': 'category'}],
+        'tags': [
+            {'id': id, 'slug': 'tag-{}'.format(id), 'name': 'Tag', 'taxonomy': 'post_tag'}
+            for id in range(2, 10)
+        ],
+    }
+    calls = []
+
+    def query_endpoint(endpoint, params, **kwargs):
+        calls.append((endpoint, sorted(params['include[]'])))
+        return kwargs['list_constructor']([
+            obj for obj in objects[endpoint] if obj['id'] in params['include[]']
+        ])
+
+    with mock.patch.object(blog, 'query_endpoint', query_endpoint):
+        post = blog.Post.from_api_object(make_post(1, tags=range(2, 11)))
+
+    assert sorted(calls) == [
+        ('categories', [1]), ('tags', list(range(2, 11))), ('users', [1]),
+    ]
+    assert post.author.slug == 'author'
+    assert [tag.id for tag in post.tags if tag] == list(range(2, 10))
+    assert post.tags[-1] is None
+    assert cache_lookup(blog.TERM_BY_ID.key(9)).slug == 'tag-9'
+
+
+def test_run_concurrently_overlaps_calls_without_nesting_on_the_pool():
+    barrier = threading.Barrier(3, timeout=1)
+
+    def wait_for_others(result):
+        barrier.wait()
+        return result
+
+    def nested():
+        threads = blog.run_concurrently([threading.get_ident, threading.get_ident])
+        return len(set(threads))
+
+    assert blog.run_concurrently([
+        functools.partial(wait_for_others, 'a'),
+        functools.partial(wait_for_others, 'b'),
+        functools.partial(wait_for_others, 'c'),
+    ]) == ['a', 'b', 'c']
+    assert blog.run_concurrently([lambda: None, nested]) == [None, 1]
+
+    def fail():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        blog.run_concurrently([lambda: None, fail])
+
+
+def test_loader_runs_distinct_loads_once_and_concurrently():
+    barrier = threading.Barrier(2, timeout=1)
+    calls = []
+
+    def load(id):
+        calls.append(id)
+        barrier.wait()
+        return id * 2
+
+    loader = blog.Loader()
+    futures = [loader.load(load, id) for id in (1, 2, 1)]
+    assert loader.load(load, 2) is futures[1]
+    assert [future.result() for future in futures] == [2, 4, 2]
+    assert sorted(calls) == [1, 2]
+
+    def nested():
+        return blog.Loader().load(threading.get_ident).result()
+
+    # Loads from the pool's threads run in place
+    outer, inner = blog.Loader().load(lambda: (threading.get_ident(), nested())).result()
+    assert outer == inner != threading.get_ident()
+
+
+def test_iter_posts_prefetches_the_next_page():
+    requested = {page: threading.Event() for page in (1, 2, 3)}
+
+    def get_posts(params, headers=False):
+        requested[params['page']].set()
+        page = params['page']
+        return [page * 10, page * 10 + 1], {'X-WP-TotalPages': '3'}
+
+    with mock.patch.object(blog, 'get_posts', get_posts):
+        posts = blog.iter_posts(page_size=2)
+        assert next(posts) == 10
+        assert requested[2].wait(1)
+        assert not requested[3].is_set()
+        assert list(posts) == [11, 20, 21, 30, 31]
+
+
+def test_post_summaries_are_projected_and_cached_separately(cached_objects):
+    requests = []
+
+    def query_endpoint(endpoint, params, **kwargs):
+        requests.append(params)
+        objs = [make_post(id) for id in params['include[]']]
+        for obj in objs:
+            del obj['content']
+        return kwargs['list_constructor'](objs)
+
+    with mock.patch.object(blog, 'query_endpoint', query_endpoint):
+        summaries = blog.get_post_summaries_by_ids([2, 1])
+        local_cache().clear()
+        assert blog.get_post_summaries_by_ids([1, 2]) == summaries[::-1]
+
+    assert len(requests) == 1
+    assert requests[0]['_fields'] == blog.PostSummary.API_FIELDS
+    assert [summary.permalink for summary in summaries] == [
+        '/news/2017/09/01/post-2/', '/news/2017/09/01/post-1/',
+    ]
+    with pytest.raises(KeyError):
+        cache_lookup(blog.POST_BY_ID.key(1))
+
+
+def test_posts_cache_their_summaries(cached_objects):
+    post = blog.Post.from_api_object(make_post(1))
+    local_cache().clear()
+    assert cache_lookup(blog.POST_SUMMARY_BY_ID.key(1)) == post.summary()
+
+
+def test_unchanged_posts_are_revalidated_by_modification_time(cached_objects):
+    post = blog.Post.from_api_object(make_post(1))
+    requests = []
+
+    def query_endpoint(endpoint, params, **kwargs):
+        requests.append((endpoint, params))
+        return {'modified': '2017-09-02T12:00:00'}
+
+    with mock.patch.object(blog, 'query_endpoint', query_endpoint):
+        assert blog.get_post_by_id.uncached(1) == post
+    assert requests == [('posts/1', {'_fields': 'modified'})]
+
+
+def test_unchanged_users_are_revalidated_with_validators(cached_objects):
+    def response(status, headers):
+        r = requests.Response()
+        r.status_code = status
+        r.headers.update(headers)
+        r._content = b'{"id": 1, "slug": "renamed", "name": "Author"}'
+        return r
+
+    session = mock.Mock()
+    session.get.return_value = response(200, {'ETag': '"v1"'})
+    with mock.patch.object(blog, '_get_session', return_value=session):
+        assert blog.get_user_by_id.uncached(1).slug == 'renamed'
+        assert session.get.call_args[1]['headers'] == {}
+
+        session.get.return_value = response(304, {})
+        assert blog.get_user_by_id.uncached(1).slug == 'renamed'
+        assert session.get.call_args[1]['headers'] == {'If-None-Match': '"v1"'}
+
+
+def test_each_process_gets_its_own_session_with_the_api_timeout(monkeypatch, settings):
+    settings.BLOG_API_TIMEOUT = 7
+    monkeypatch.setattr(blog, '_session', None)
+    monkeypatch.setattr(blog, '_session_pid', None)
+    session = blog._get_session()
+    assert blog._get_session() is session
+
+    # As if forked
+    with mock.patch.object(blog.os, 'getpid', return_value=os.getpid() + 1):
+        forked = blog._get_session()
+        assert forked is not session
+        assert blog._get_session() is forked
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"id": 1}'
+        with mock.patch.object(forked, 'get', return_value=response) as get:
+            assert blog.query_endpoint('users/1') == {'id': 1}
+    assert get.call_args[1]['timeout'] == 7
+
+
+def test_misses_are_counted_once(locmem_cache, monkeypatch):
+    monkeypatch.setattr(cache_stats, '_stats', cache_stats.CacheStats())
+    monkeypatch.setattr(cache_stats, '_stats_pid', os.getpid())
+    with mock.patch.object(blog, 'query_endpoint', return_value=(blog.User(1, 'author', 'Author'), {})):
+        blog.get_user_by_id(1)
+
+    families = cache_stats.aggregate([cache_stats.stats().snapshot()])
+    assert families['wp_user_by_id'].misses == 1
+
+
+def test_decoding_posts_does_not_count_reference_lookups(cached_objects, monkeypatch):
+    blog.Post.from_api_objects([make_post(1)])
+    monkeypatch.setattr(cache_stats, '_stats', cache_stats.CacheStats())
+    monkeypatch.setattr(cache_stats, '_stats_pid', os.getpid())
+    local_cache().clear()
+
+    assert cache_lookup(blog.POST_BY_ID.key(1)).author.id == 1
+
+    families = cache_stats.aggregate([cache_stats.stats().snapshot()])
+    assert families['wp_post_by_id'].hits == 1
+    users = families['wp_user_by_id']
+    assert users.hits == users.local_hits == users.misses == 0
+
+
+def test_missing_posts_and_slugs_are_cached_briefly(locmem_cache):
+    with mock.patch.object(blog, 'query_endpoint') as query:
+        query.side_effect = requests.HTTPError(response=mock.Mock(status_code=404))
+        assert blog.get_post_by_id(404) is None
+        assert blog.get_post_by_id(404) is None
+        assert query.call_count == 1
+
+        query.side_effect = None
+        query.return_value = []
+        assert blog.get_post_by_slug('junk') is None
+        assert blog.get_post_by_slug('junk') is None
+        assert query.call_count == 2
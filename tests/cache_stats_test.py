@@ -0,0 +1,70 @@
+import itertools
+import json
+import os
+
+import mock
+import pytest
+from django.core.management import call_command
+
+import scifiweb.cache_stats as cache_stats
+from scifiweb.caching import cache_lookup_with_fallback
+from scifiweb.caching import KeyFamily
+
+
+@pytest.fixture
+def fresh_stats(locmem_cache, monkeypatch):
+    monkeypatch.setattr(cache_stats, '_stats', cache_stats.CacheStats())
+    monkeypatch.setattr(cache_stats, '_stats_pid', os.getpid())
+    monkeypatch.setattr(cache_stats, '_size_samples', itertools.count())
+    key = KeyFamily('posts').key(1)
+    cache_lookup_with_fallback(key, lambda: 'post', 60)
+    cache_lookup_with_fallback(key, lambda: 'post', 60)
+    return cache_stats.stats()
+
+
+def test_only_some_sizes_of_values_other_than_bytes_are_measured(fresh_stats):
+    with mock.patch.object(cache_stats.pickle, 'dumps', wraps=cache_stats.pickle.dumps) as dumps:
+        for _ in range(cache_stats._SIZE_SAMPLE_RATE * 2):
+            cache_stats.observe_size('values:1', ['value'])
+            cache_stats.observe_size('bytes:1', b'value')
+    assert dumps.call_count == 2
+
+    families = cache_stats.aggregate([fresh_stats.snapshot()])
+    assert families['values'].value_bytes.count == 2
+    assert families['bytes'].value_bytes.count == cache_stats._SIZE_SAMPLE_RATE * 2
+    assert families['bytes'].value_bytes.mean() == len(b'value')
+
+
+def test_view_requires_the_token(client, fresh_stats, settings):
+    settings.DEBUG = False
+    settings.CACHE_STATS_TOKEN = 'secret'
+    assert client.get('/internal/cache-stats').status_code == 404
+    assert client.get('/internal/cache-stats', HTTP_AUTHORIZATION='Bearer wrong').status_code == 404
+
+    response = client.get('/internal/cache-stats', HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == 200
+    summary = json.loads(response.content.decode('utf-8'))
+    assert summary['workers'] == [fresh_stats.snapshot()['worker']]
+    posts, = [row for row in summary['families'] if row['family'] == 'posts']
+    assert (posts['lookups'], posts['local_hits'], posts['misses']) == (2, 1, 1)
+
+
+def test_view_is_hidden_without_a_configured_token(client, fresh_stats, settings):
+    settings.DEBUG = False
+    settings.CACHE_STATS_TOKEN = ''
+    assert client.get('/internal/cache-stats', HTTP_AUTHORIZATION='Bearer ').status_code == 404
+
+
+def test_command_prints_a_table(fresh_stats, capsys):
+    call_command('cache_stats')
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'Workers: 1'
+    assert lines[1].split()[:3] == ['Family', 'Lookups', 'Hit']
+    assert any(line.split()[:3] == ['posts', '2', '50%'] for line in lines[2:])
+
+
+def test_command_prints_json(fresh_stats, capsys):
+    call_command('cache_stats', '--json')
+    rows = json.loads(capsys.readouterr().out)
+    posts, = [row for row in rows if row['family'] == 'posts']
+    assert posts['hit_rate'] == 0.5
@@ -0,0 +1,277 @@
+import itertools
+import threading
+
+import mock
+import pytest
+from django.core.cache import cache as django_cache
+
+import scifiweb.cache_stats as cache_stats
+import scifiweb.caching as caching
+from scifiweb.caching import cache
+from scifiweb.caching import cache_lookup
+from scifiweb.caching import cache_lookup_with_fallback
+from scifiweb.caching import KeyFamily
+from scifiweb.caching import LocalCache
+
+
+@pytest.fixture(autouse=True)
+def autouse_locmem_cache(locmem_cache, monkeypatch):
+    cache_stats._stats_pid = None
+    # So that the first value which isn't bytes gets measured
+    monkeypatch.setattr(cache_stats, '_size_samples', itertools.count())
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(2)
+    local.set('a', 1, None)
+    local.set('b', 2, None)
+    local.get('a')
+    local.set('c', 3, None)
+    assert local.get('a') == 1
+    assert local.get('b') is None
+    assert local.get('c') == 3
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'monotonic', lambda: now[0])
+    local = LocalCache(2)
+    local.set('a', 1, 10)
+    assert local.get('a') == 1
+    now[0] += 11
+    assert local.get('a', 'missing') == 'missing'
+
+
+def test_cached_none_is_a_hit():
+    calls = []
+
+    def fallback():
+        calls.append(1)
+
+    assert cache_lookup_with_fallback('none', fallback, 60) is None
+    assert cache_lookup_with_fallback('none', fallback, 60) is None
+    assert len(calls) == 1
+
+
+def test_lookup_is_served_locally_after_shared_cache_hit():
+    django_cache.set('key', 'value', 60)
+    assert cache_lookup('key') == 'value'
+    # Gone from the shared cache, but this process still has it
+    django_cache.delete('key')
+    assert cache_lookup('key') == 'value'
+
+
+def test_cache_decorator_writes_both_tiers():
+    @cache(ttl=60)
+    def double(x):
+        return 2 * x
+
+    assert double(2) == 4
+    assert len(caching.local_cache()) == 1
+    caching.local_cache().clear()
+    assert double(2) == 4
+
+
+def test_concurrent_misses_call_fallback_once():
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def fallback():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                cache_lookup_with_fallback('hot', fallback, 60),
+            ),
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['value'] * 5
+    assert len(calls) == 1
+
+
+def test_lock_loser_waits_for_winners_result(monkeypatch):
+    monkeypatch.setattr(caching, '_LOCK_POLL_INTERVAL', 0.01)
+    # Pretend another process is recomputing the key
+    django_cache.add(caching._lock_key('hot'), 'someone-else', 60)
+    timer = threading.Timer(0.05, lambda: django_cache.set('hot', 'theirs', 60))
+    timer.start()
+
+    assert cache_lookup_with_fallback('hot', lambda: 'ours', 60) == 'theirs'
+    timer.join()
+
+
+def test_stale_value_is_served_while_refreshing(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'time', lambda: now[0])
+    values = iter(('old', 'new'))
+
+    def fallback():
+        return next(values)
+
+    assert cache_lookup_with_fallback('key', fallback, 10, stale_ttl=60) == 'old'
+    now[0] += 11
+    assert cache_lookup_with_fallback('key', fallback, 10, stale_ttl=60) == 'old'
+    caching._get_refresh_executor().shutdown(wait=True)
+    caching._refresh_executor_pid = None
+    assert cache_lookup('key') == 'new'
+
+
+def test_cache_lookup_only_refreshes_stale_values(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'time', lambda: now[0])
+    refreshed = threading.Event()
+
+    @caching.cache_lookup_only(key=lambda x: ('only', x))
+    def get(x):
+        caching.cache_set(('only', x), 'new', 10, stale_ttl=60)
+        refreshed.set()
+        return 'new'
+
+    caching.cache_set(('only', 1), 'old', 10, stale_ttl=60)
+    assert get(1) == 'old'
+    assert not refreshed.is_set()
+    now[0] += 11
+    assert get(1) == 'old'
+    assert refreshed.wait(5)
+
+
+def test_cache_lookup_many_returns_only_hits():
+    caching.cache_set('a', 1, 60)
+    django_cache.set('b', 2, 60)
+    caching.cache_set_many({'c': 3, 'd': 4}, 60, stale_ttl=60)
+    assert caching.cache_lookup_many(['a', 'b', 'c', 'x']) == {'a': 1, 'b': 2, 'c': 3}
+
+
+def test_stats_are_grouped_by_key_family():
+    key = KeyFamily('posts').key(1)
+    cache_lookup_with_fallback(key, lambda: 'post', 60)
+    cache_lookup_with_fallback(key, lambda: 'post', 60)
+    caching.local_cache().clear()
+    cache_lookup(key)
+
+    families = cache_stats.aggregate([cache_stats.stats().snapshot()])
+    stats = families['posts']
+    assert (stats.misses, stats.local_hits, stats.hits) == (1, 1, 1)
+    assert stats.fallback_ms.count == 1
+    assert stats.value_bytes.count == 1
+
+
+def test_key_family_keys_are_compact_and_versioned():
+    family = KeyFamily('post_id_by_slug', 3)
+    key = family.key('hello-world')
+    assert key.startswith('post_id_by_slug:3.')
+    assert key.endswith(':hello-world')
+    assert family.key('hello-world') == key
+
+    hashed = family.key('an odd slug/with spaces', ('and', 'a', 'tuple'))
+    assert ' ' not in hashed and len(hashed) < 60
+
+
+def test_bumping_a_key_family_invalidates_its_keys():
+    posts = KeyFamily('posts')
+    users = KeyFamily('users')
+    caching.cache_set(posts.key(1), 'post', 60)
+    caching.cache_set(users.key(1), 'user', 60)
+
+    posts.bump()
+
+    with pytest.raises(KeyError):
+        cache_lookup(posts.key(1))
+    assert cache_lookup(users.key(1)) == 'user'
+
+
+def test_shared_only_families_are_not_kept_locally():
+    shared = KeyFamily('shared', local=False)
+    caching.cache_set(shared.key(1), 'value', 60)
+    assert cache_lookup(shared.key(1)) == 'value'
+    django_cache.delete(shared.key(1))
+    with pytest.raises(KeyError):
+        cache_lookup(shared.key(1))
+
+
+class ReversingCodec:
+    @staticmethod
+    def dumps(value):
+        return value[::-1].encode('utf-8')
+
+    @staticmethod
+    def loads(data):
+        if not data.endswith(b'!'):
+            raise ValueError('Not reversed')
+        return data.decode('utf-8')[::-1]
+
+
+def test_codec_families_store_encoded_values():
+    family = KeyFamily('reversed', codec=ReversingCodec)
+    caching.cache_set(family.key(1), '!hello', 60)
+    caching.cache_set_many({family.key(2): '!world'}, 60, stale_ttl=60)
+    assert django_cache.get(family.key(1)) == b'olleh!'
+
+    caching.local_cache().clear()
+    assert cache_lookup(family.key(1)) == '!hello'
+    assert caching.cache_lookup_many([family.key(1), family.key(2)]) == {
+        family.key(1): '!hello',
+        family.key(2): '!world',
+    }
+
+
+def test_codec_families_store_none_as_is():
+    family = KeyFamily('reversed', codec=ReversingCodec)
+    caching.cache_set(family.key(1), None, 60)
+    caching.cache_set_many({family.key(2): None, family.key(3): '!hi'}, 60, stale_ttl=60)
+
+    caching.local_cache().clear()
+    assert cache_lookup(family.key(1)) is None
+    assert cache_lookup(family.key(2)) is None
+    assert cache_lookup(family.key(3)) == '!hi'
+
+
+def test_undecodable_values_are_misses():
+    family = KeyFamily('reversed', codec=ReversingCodec)
+    django_cache.set(family.key(1), b'garbage', 60)
+    with pytest.raises(KeyError):
+        cache_lookup(family.key(1))
+
+
+def test_retry_backs_off_between_attempts(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(caching.time, 'sleep', sleeps.append)
+    attempts = []
+
+    @caching.retry(4, IOError, backoff=0.1, max_backoff=0.3, jitter=False)
+    def fail():
+        attempts.append(1)
+        raise IOError()
+
+    with pytest.raises(IOError):
+        fail()
+    assert len(attempts) == 4
+    assert sleeps == [0.1, 0.2, 0.3]
+
+
+def test_shared_hits_on_redis_fetch_the_ttl_in_the_same_round_trip(locmem_cache, monkeypatch):
+    redis = mock.Mock()
+    redis.client.make_key.side_effect = lambda key: ':1:' + key
+    redis.client.decode.side_effect = lambda value: value.decode()
+    pipeline = redis.client.get_client.return_value.pipeline.return_value
+    pipeline.execute.return_value = [b'value', 30]
+    monkeypatch.setattr(caching, 'django_cache', redis)
+
+    assert cache_lookup('key') == 'value'
+    assert pipeline.execute.call_count == 1
+    assert not redis.ttl.called
+    assert caching.local_cache().get('key') == 'value'
@@ -0,0 +1,65 @@
+import pytest
+
+import scifiweb.circuit as circuit
+from scifiweb.circuit import CircuitBreaker
+from scifiweb.circuit import CircuitOpenError
+
+
+class Flaky:
+    def __init__(self):
+        self.calls = 0
+        self.failing = True
+
+    def __call__(self):
+        self.calls += 1
+        if self.failing:
+            raise IOError('down')
+        return 'up'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit.time, 'time', lambda: now[0])
+    return now
+
+
+def test_circuit_opens_after_repeated_failures(locmem_cache, clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30)
+    service = Flaky()
+
+    for _ in range(3):
+        with pytest.raises(IOError):
+            breaker.call(service)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(service)
+    assert service.calls == 3
+
+
+def test_circuit_closes_after_successful_probe(locmem_cache, clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=30)
+    service = Flaky()
+    with pytest.raises(IOError):
+        breaker.call(service)
+
+    # A failed probe keeps it open for another period
+    clock[0] += 31
+    with pytest.raises(IOError):
+        breaker.call(service)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(service)
+
+    clock[0] += 31
+    service.failing = False
+    assert breaker.call(service) == 'up'
+    assert not breaker.is_open
+    assert breaker.call(service) == 'up'
+
+
+def test_ignored_exceptions_do_not_open_the_circuit(locmem_cache, clock):
+    breaker = CircuitBreaker(
+        'test', failure_threshold=1, is_failure=lambda e: False,
+    )
+    with pytest.raises(IOError):
+        breaker.call(Flaky())
+    assert not breaker.is_open
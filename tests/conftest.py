@@ -0,0 +1,21 @@
+import pytest
+from django.core.cache import cache as django_cache
+
+import scifiweb.caching as caching
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Swaps the dummy development cache for a real in-memory one, with
+    a small in-process tier in front of it."""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+    settings.LOCAL_CACHE_MAX_ENTRIES = 10
+    caching._local_cache = None
+    caching.KeyFamily._generations.clear()
+    django_cache.clear()
+    yield django_cache
+    caching._local_cache = None
@@ -0,0 +1,26 @@
+from scifiweb.news import content
+
+
+def test_links_to_the_cms_are_forwarded():
+    assert content.process(
+        '<a href="https://wp.projectscifi.org/2017/09/01/post/">Post</a>'
+        '<img src="https://wp.projectscifi.org/wp-content/uploads/a.jpg" width="1" height="1" loading="lazy">'
+    ) == (
+        '<a href="/news/2017/09/01/post/">Post</a>'
+        '<img src="https://wp.projectscifi.org/wp-content/uploads/a.jpg" width="1" height="1" loading="lazy" />'
+    )
+
+
+def test_images_are_lazy_loaded_with_dimensions():
+    assert content.process('<img src="/uploads/photo-300x200.jpg" alt="Photo">') == (
+        '<img src="/uploads/photo-300x200.jpg" alt="Photo" loading="lazy" width="300" height="200" />'
+    )
+    assert content.process('<img src="/uploads/photo.jpg" height="10" />') == (
+        '<img src="/uploads/photo.jpg" height="10" loading="lazy" />'
+    )
+
+
+def test_comments_and_empty_paragraphs_are_stripped():
+    assert content.process(
+        '<!-- wp:paragraph -->\n<p>Text</p>\n<!-- /wp:paragraph -->\n<p>&nbsp;</p>\n<p><br /></p>'
+    ) == '\n<p>Text</p>\n\n'
@@ -0,0 +1,129 @@
+import mock
+import pytest
+from django.core.management import call_command
+
+import scifiweb.news.blog as blog
+import scifiweb.news.search as search
+from scifiweb.news.management.commands import mirror_blog
+from scifiweb.news.signals import post_changed
+
+
+def make_post(id, modified='2017-09-02T12:00:00', tags=()):
+    return {
+        'id': id,
+        'slug': 'post-{}'.format(id),
+        'date': '2017-09-01T12:00:00',
+        'modified': modified,
+        'title': {'rendered': 'Post {}'.format(id)},
+        'author': 1,
+        'content': {'rendered': '<p>Content</p>'},
+        'excerpt': {'rendered': '<p>Excerpt</p>'},
+        'categories': [1],
+        'tags': list(tags),
+    }
+
+
+class WordPress:
+    """Answers queries like the WordPress API would, from lists of API
+    objects by endpoint."""
+
+    def __init__(self):
+        self.objects = {
+            'users': [{'id': 1, 'slug': 'author', 'name': 'Author'}],
+            'categories': [{'id': 1, 'slug': 'news', 'name': 'News', 'taxonomy': 'category'}],
+            'tags': [{'id': 2, 'slug': 'lab', 'name': 'Lab', 'taxonomy': 'post_tag'}],
+            'posts': [make_post(1), make_post(2, tags=(2,))],
+        }
+
+    def query_endpoint(self, endpoint, params=None, headers=False, **kwargs):
+        params = params or {}
+        objs = sorted(self.objects[endpoint], key=lambda obj: (obj.get('modified', ''), obj['id']))
+        if 'modified_after' in params:
+            objs = [obj for obj in objs if obj['modified'] > params['modified_after']]
+        if 'include[]' in params:
+            objs = [obj for obj in objs if obj['id'] in params['include[]']]
+        total = len(objs)
+        per_page = params.get('per_page', 10)
+        start = (params.get('page', 1) - 1) * per_page
+        objs = objs[start:start + per_page]
+        if params.get('_fields') == 'id':
+            objs = [{'id': obj['id']} for obj in objs]
+        result = kwargs['list_constructor'](objs)
+        if headers:
+            return result, {
+                'X-WP-Total': str(total),
+                'X-WP-TotalPages': str(max(1, -(-total // per_page))),
+            }
+        return result
+
+
+@pytest.fixture
+def wordpress(locmem_cache, monkeypatch):
+    monkeypatch.setattr(search, '_index', None)
+    monkeypatch.setattr(search, '_index_version', None)
+    monkeypatch.setattr(search, '_index_checked', None)
+    wordpress = WordPress()
+    with mock.patch.object(blog, 'query_endpoint', wordpress.query_endpoint):
+        yield wordpress
+
+
+def test_mirror_caches_everything_the_getters_read(wordpress):
+    call_command('mirror_blog', '--once')
+
+    with mock.patch.object(blog, 'query_endpoint', side_effect=AssertionError('Not cached')):
+        assert blog.get_user_by_id(1).slug == 'author'
+        assert blog.get_category_by_id(1).slug == 'news'
+        assert blog.get_tag_by_id(2).slug == 'lab'
+        assert blog.get_post_by_id(1).title == 'Post 1'
+        assert [tag.slug for tag in blog.get_post_by_slug('post-2').tags] == ['lab']
+        assert [summary.slug for summary in blog.get_post_summaries_by_ids([1, 2])] == ['post-1', 'post-2']
+
+    index = search.get_index()
+    assert sorted(index.documents) == [1, 2]
+
+
+def test_mirror_starts_over_from_the_published_index_after_a_failed_refresh(wordpress):
+    class Stop(Exception):
+        pass
+
+    published = []
+    changes = []
+    publish_index = search.publish_index
+    fail_publishing = [False]
+
+    def flaky_publish_index(index):
+        if fail_publishing[0]:
+            fail_publishing[0] = False
+            raise ConnectionError('Redis is down')
+        publish_index(index)
+
+    def wait(self, seconds):
+        index = search.load_published_index()
+        published.append((index.version, sorted(index.documents)))
+        if len(published) == 1:
+            # The next refresh finds a new post, but fails to publish it
+            wordpress.objects['posts'].append(make_post(3, modified='2017-09-03T12:00:00'))
+            fail_publishing[0] = True
+        elif len(published) == 3:
+            raise Stop()
+
+    def receiver(sender, **kwargs):
+        changes.append(kwargs['post_id'])
+
+    # As if the worker was restarted
+    call_command('mirror_blog', '--once')
+    post_changed.connect(receiver)
+    try:
+        with mock.patch.object(mirror_blog.Command, 'wait', wait), \
+                mock.patch.object(search, 'publish_index', flaky_publish_index), \
+                pytest.raises(Stop):
+            call_command('mirror_blog', '--interval', '0')
+    finally:
+        post_changed.disconnect(receiver)
+
+    first, after_failure, republished = published
+    assert first[1] == [1, 2]
+    assert after_failure == first
+    assert republished[1] == [1, 2, 3]
+    # The post is announced once it's in the published index
+    assert changes == [3]
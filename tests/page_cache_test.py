@@ -0,0 +1,54 @@
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from scifiweb.news.signals import post_changed
+from scifiweb.page_cache import BLOG_PAGES
+from scifiweb.page_cache import cache_response
+
+
+def counting_view(response=lambda: HttpResponse('page')):
+    calls = []
+
+    def view(request):
+        calls.append(request)
+        return response()
+    return view, calls
+
+
+def test_pages_are_cached_by_canonical_url(locmem_cache):
+    view, calls = counting_view()
+    cached_view = cache_response()(view)
+    factory = RequestFactory()
+
+    assert cached_view(factory.get('/news/?b=2&a=1')).content == b'page'
+    response = cached_view(factory.get('/news/?a=1&b=2'))
+    assert response.content == b'page'
+    assert response['Content-Type'] == 'text/html; charset=utf-8'
+    assert len(calls) == 1
+
+    cached_view(factory.get('/news/?a=2'))
+    cached_view(factory.post('/news/?a=1&b=2'))
+    assert len(calls) == 3
+
+
+def test_responses_setting_cookies_are_not_shared(locmem_cache):
+    def response():
+        response = HttpResponse('page')
+        response.set_cookie('session', 'secret')
+        return response
+    view, calls = counting_view(response)
+    cached_view = cache_response()(view)
+
+    for _ in range(2):
+        assert cached_view(RequestFactory().get('/')).cookies['session'].value == 'secret'
+    assert len(calls) == 2
+
+
+def test_blog_pages_are_dropped_when_the_blog_changes(locmem_cache):
+    view, calls = counting_view()
+    cached_view = cache_response(family=BLOG_PAGES)(view)
+
+    cached_view(RequestFactory().get('/news/'))
+    post_changed.send(sender=None, post_id=1, slugs={'post'})
+    cached_view(RequestFactory().get('/news/'))
+    assert len(calls) == 2
@@ -0,0 +1,170 @@
+import datetime
+
+import mock
+import pytest
+
+import scifiweb.news.blog as blog
+import scifiweb.news.search as search
+import scifiweb.news.views as views
+from scifiweb.news.signals import post_changed
+
+
+AUTHOR = blog.User(1, 'author', 'Author')
+OTHER_AUTHOR = blog.User(2, 'other', 'Other')
+NEWS = blog.Term(1, 'news', 'News', 'category')
+LAB = blog.Term(2, 'lab', 'Lab', 'post_tag')
+
+
+def make_post(id, title, content='', author=AUTHOR, tags=(), day=1):
+    date = datetime.datetime(2017, 9, day, 12)
+    return blog.Post(
+        id=id,
+        slug='post-{}'.format(id),
+        date=date,
+        modified=date,
+        title=title,
+        author=author,
+        content='<p>{}</p>'.format(content),
+        excerpt='',
+        categories=[NEWS],
+        tags=list(tags),
+    )
+
+
+@pytest.fixture
+def index():
+    return search.SearchIndex.from_posts([
+        make_post(1, 'Lab tour', 'Come see the lab.', day=1),
+        make_post(2, 'Hackathon', 'Lab coats &amp; laptops.', tags=(LAB,), day=2),
+        make_post(3, 'Movie night', 'Popcorn in the lounge.', author=OTHER_AUTHOR, day=3),
+        make_post(4, 'Printing', 'The printers in the lab are fixed.', day=4),
+    ])
+
+
+def test_search_matches_all_words_by_prefix(index):
+    assert index.search({'search': 'lab'})[0] == [4, 2, 1]
+    assert index.search({'search': 'lab print'})[0] == [4]
+    assert index.search({'search': 'coat'})[0] == [2]
+    assert index.search({'search': 'nothing'}) == ([], 0, 0)
+
+
+def test_search_ranks_by_relevance(index):
+    ids, _, _ = index.search({'search': 'lab', 'orderby': 'relevance'})
+    # The title counts for more than the content
+    assert ids[0] == 1
+
+
+def test_search_filters(index):
+    assert index.search({'author[]': ['2']})[0] == [3]
+    assert index.search({'tags[]': ['2']})[0] == [2]
+    assert index.search({'categories[]': ['1'], 'order': 'asc'})[0] == [1, 2, 3, 4]
+    assert index.search({
+        'after': '2017-09-02T00:00:00',
+        'before': '2017-09-03T23:59:59',
+    })[0] == [3, 2]
+
+
+def test_search_paginates_like_wordpress(index):
+    assert index.search({}, page=2, per_page=3) == ([1], 4, 2)
+    with pytest.raises(search.InvalidSearch):
+        index.search({}, page=3, per_page=3)
+    with pytest.raises(search.InvalidSearch):
+        index.search({'author[]': ['bob']})
+
+
+def test_published_index_is_loaded_by_other_processes(locmem_cache, index, monkeypatch):
+    monkeypatch.setattr(search, '_index_checked', None)
+    monkeypatch.setattr(search, '_index_version', None)
+    assert search.get_index() is None
+
+    search.publish_index(index)
+    monkeypatch.setattr(search, '_index_checked', None)
+    assert len(search.get_index()) == 4
+
+
+def test_index_is_rechecked_as_soon_as_blog_pages_are_dropped(locmem_cache, index, monkeypatch):
+    monkeypatch.setattr(search, '_index_checked', None)
+    monkeypatch.setattr(search, '_index_version', None)
+    search.publish_index(index)
+    assert len(search.get_index()) == 4
+
+    index.update([], {4})
+    search.publish_index(index)
+    assert len(search.get_index()) == 4
+    post_changed.send(sender=None, post_id=4, slugs={'post-4'})
+    assert len(search.get_index()) == 3
+
+
+def test_update_replaces_and_removes_posts(index):
+    version = index.version
+    assert not index.update([], [99])
+    assert index.update([make_post(2, 'Hackathon', 'Soldering irons.')], [4])
+    assert index.version != version
+    assert index.search({'search': 'lab'})[0] == [1]
+    assert index.search({'search': 'solder'})[0] == [2]
+    assert 'coats' not in index.postings
+
+
+def test_find_slug_follows_updates(index):
+    assert index.find_slug('post-3').id == 3
+    index.update([make_post(3, 'Movie night')._replace(slug='movies')], [4])
+    assert index.find_slug('post-3') is None
+    assert index.find_slug('movies').id == 3
+    assert index.find_slug('post-4') is None
+
+
+def test_permalinks_are_resolved_from_the_index(index, monkeypatch):
+    monkeypatch.setattr(search, 'get_index', lambda: index)
+    with mock.patch.object(blog, 'get_post_by_id') as get_post_by_id, \
+            mock.patch.object(blog, 'get_post_by_slug') as get_post_by_slug:
+        get_post_by_id.return_value = make_post(2, 'Hackathon', day=2)
+        sept_2 = datetime.date(2017, 9, 2)
+        assert views.get_post_by_slug('post-2', lambda date: date == sept_2).id == 2
+        get_post_by_id.assert_called_once_with(2)
+
+        get_post_by_id.reset_mock()
+        assert views.get_post_by_slug('post-3', lambda date: date == sept_2) is None
+        assert not get_post_by_id.called
+        assert not get_post_by_slug.called
+
+
+def test_unknown_and_bogus_slugs_are_rejected_without_lookups(index, monkeypatch):
+    monkeypatch.setattr(search, 'get_index', lambda: index)
+    with mock.patch.object(blog, 'get_post_by_slug') as get_post_by_slug:
+        assert views.get_post_by_slug('unknown', known_only=True) is None
+        assert views.get_post_by_slug('wp-login.php') is None
+        assert not get_post_by_slug.called
+
+        views.get_post_by_slug('unknown')
+        get_post_by_slug.assert_called_once_with('unknown')
+
+
+def test_equivalent_searches_share_cached_results(locmem_cache, monkeypatch):
+    monkeypatch.setattr(search, 'get_index', lambda: None)
+    summary = make_post(1, 'Lab tour').summary()
+    with mock.patch.object(blog, 'get_post_summaries') as get_post_summaries, \
+            mock.patch.object(blog, 'get_post_summaries_by_ids') as get_post_summaries_by_ids:
+        get_post_summaries.return_value = [summary], {'X-WP-Total': '11', 'X-WP-TotalPages': '2'}
+        get_post_summaries_by_ids.return_value = [summary]
+        page_params = {'page': 2, 'per_page': 10}
+
+        assert views.search_posts({'tags[]': ['2', '1'], 'order': 'desc'}, page_params) == ([summary], 11, 2)
+        assert views.search_posts({'tags[]': ['1', '2', '2'], 'orderby': 'date'}, page_params) == ([summary], 11, 2)
+        get_post_summaries.assert_called_once_with({'tags[]': ['1', '2'], 'page': 2, 'per_page': 10}, headers=True)
+        get_post_summaries_by_ids.assert_called_with([1])
+
+        post_changed.send(sender=None, post_id=1, slugs={'post-1'})
+        views.search_posts({'tags[]': ['1', '2']}, page_params)
+        assert get_post_summaries.call_count == 2
+
+
+def test_search_titles_look_up_names_in_one_batch():
+    with mock.patch.object(blog, 'resolve_references') as resolve_references:
+        resolve_references.return_value = {1: AUTHOR}, {1: NEWS, 2: LAB}
+        _, hero_title, subtitle = views.render_search_titles(
+            {'author[]': ['1', '1', 'bob'], 'tags[]': ['2', '1'], 'categories[]': ['1']},
+            {'page': 1},
+        )
+    resolve_references.assert_called_once_with(frozenset({1}), frozenset({1}), frozenset({1, 2}))
+    assert hero_title == 'News search'
+    assert 'Author' in subtitle and 'Lab' in subtitle and 'News' in subtitle
@@ -0,0 +1,109 @@
+import datetime
+import json
+
+import mock
+import pytest
+import requests
+
+import scifiweb.news.blog as blog
+from scifiweb.caching import cache_lookup
+from scifiweb.caching import cache_set
+from scifiweb.news.signals import post_changed
+
+
+def post(client, body, token='secret'):
+    return client.post(
+        '/internal/blog-webhook', json.dumps(body),
+        content_type='application/json',
+        HTTP_AUTHORIZATION='Bearer ' + token,
+    )
+
+
+@pytest.fixture
+def webhook(settings, locmem_cache):
+    settings.BLOG_WEBHOOK_TOKEN = 'secret'
+
+
+def test_webhook_requires_the_token(client, webhook):
+    assert post(client, {'type': 'post', 'id': 1}, token='wrong').status_code == 404
+    assert post(client, {'type': 'page', 'id': 1}).status_code == 400
+
+
+def test_webhook_replaces_a_changed_post(client, webhook):
+    date = datetime.datetime(2017, 9, 1)
+    old = blog.Post(1, 'old-slug', date, date, 'Old', None, '', '', [], [])
+    cache_set(blog.POST_BY_ID.key(1), old, 60)
+    cache_set(blog.POST_ID_BY_SLUG.key('old-slug'), 1, 60)
+    new = old._replace(slug='new-slug')
+    changes = []
+
+    def receiver(sender, **kwargs):
+        changes.append(kwargs)
+
+    post_changed.connect(receiver)
+    try:
+        with mock.patch.object(blog.get_post_by_id, 'uncached', return_value=new):
+            response = post(client, {'type': 'post', 'id': 1})
+    finally:
+        post_changed.disconnect(receiver)
+
+    assert response.status_code == 200
+    assert changes == [{'signal': post_changed, 'post_id': 1, 'slugs': {'old-slug', 'new-slug'}}]
+    with pytest.raises(KeyError):
+        cache_lookup(blog.POST_ID_BY_SLUG.key('old-slug'))
+    assert blog.take_sync_request()
+    assert not blog.take_sync_request()
+
+
+def test_webhook_drops_a_post_which_is_no_longer_public(client, webhook):
+    date = datetime.datetime(2017, 9, 1)
+    old = blog.Post(1, 'old-slug', date, date, 'Old', None, '', '', [], [])
+    cache_set(blog.POST_BY_ID.key(1), old, 60, 60)
+    cache_set(blog.POST_ID_BY_SLUG.key('old-slug'), 1, 60)
+    changes = []
+
+    def receiver(sender, **kwargs):
+        changes.append(kwargs)
+
+    # What WordPress says about trashed posts
+    forbidden = requests.Response()
+    forbidden.status_code = 401
+    post_changed.connect(receiver)
+    try:
+        with mock.patch.object(blog, 'query_endpoint', side_effect=requests.HTTPError(response=forbidden)):
+            response = post(client, {'type': 'post', 'id': 1})
+    finally:
+        post_changed.disconnect(receiver)
+
+    assert response.status_code == 200
+    assert changes == [{'signal': post_changed, 'post_id': 1, 'slugs': {'old-slug'}}]
+    assert cache_lookup(blog.POST_BY_ID.key(1)) is None
+    with pytest.raises(KeyError):
+        cache_lookup(blog.POST_ID_BY_SLUG.key('old-slug'))
+    assert blog.take_sync_request()
+
+
+def test_webhook_refreshes_a_category(client, webhook):
+    category = blog.Term(1, 'news', 'News', 'category')
+    cache_set(blog.TERM_BY_ID.key(1), category, 60)
+    not_found = requests.Response()
+    not_found.status_code = 404
+    categories = []
+
+    def query_endpoint(endpoint, params, **kwargs):
+        if endpoint.startswith('tags/'):
+            raise requests.HTTPError(response=not_found)
+        # The category is still cached while it's being fetched
+        assert cache_lookup(blog.TERM_BY_ID.key(1)) == category
+        if not categories:
+            raise requests.Timeout()
+        return kwargs['constructor'](categories[0]), {}
+
+    with mock.patch.object(blog, 'query_endpoint', query_endpoint):
+        with pytest.raises(requests.Timeout):
+            post(client, {'type': 'term', 'id': 1})
+        assert cache_lookup(blog.TERM_BY_ID.key(1)) == category
+
+        categories.append({'id': 1, 'slug': 'news', 'name': 'Updates', 'taxonomy': 'category'})
+        assert post(client, {'type': 'term', 'id': 1}).status_code == 200
+    assert cache_lookup(blog.TERM_BY_ID.key(1)).name == 'Updates'